@@ -0,0 +1,178 @@
+# bench.py
+# Micro/macro benchmarks for the fuzzer's hot paths.
+# Usage:
+#   python bench.py                                  # run all, write results/bench.json
+#   python bench.py --filter handle                  # only cases whose name contains "handle"
+#   python bench.py --save-baseline bench_baseline.json
+#   python bench.py --baseline bench_baseline.json --threshold 0.10   # exit 1 on regression
+import argparse, json, os, platform, random, sys, time, timeit
+from packet import L2CAPFrame, serialize, parse, serialize_into, parse_from, MAX_FRAME
+from l2cap_sim import L2CAPSimulator, State, FR
+from spec import SPECS, default_payload, staged
+from vuln_sim import VulnerableSimulator
+from fast_sim import CompiledSimulator, CompiledVulnerableSimulator
+from mutation import mutate_payload_core, OperatorScheduler
+from fuzzer import StatefulFuzzer, build_valid_frame, minimize_job
+from sinks import JsonlSink
+from mux_sim import MuxFuzzer
+
+SIMULATORS = (L2CAPSimulator, VulnerableSimulator, CompiledSimulator, CompiledVulnerableSimulator)
+OPCODE_PAYLOADS = {s.name: default_payload(s) for s in SPECS}
+MINIMIZE_SIZES = (8, 32, 128, 512)
+
+def _codec_cases():
+    frame = L2CAPFrame(length=5, cid=0x0040, payload=bytes([FR, 0x01, 0x02, 0xAA, 0xBB]))
+    data = serialize(frame)
+    wire = memoryview(bytearray(MAX_FRAME))
+    end = serialize_into(frame, wire)
+    yield "codec.serialize", lambda: serialize(frame)
+    yield "codec.parse", lambda: parse(data)
+    yield "codec.serialize_into", lambda: serialize_into(frame, wire)
+    yield "codec.parse_from", lambda: parse_from(wire[:end])
+    # Largest frame: where parse_from's missing payload copy shows
+    big = L2CAPFrame(length=65535, cid=0x0040, payload=bytes(65535))
+    big_data, big_end = serialize(big), serialize_into(big, wire)
+    yield "codec.serialize.64K", lambda: serialize(big)
+    yield "codec.parse.64K", lambda: parse(big_data)
+    yield "codec.serialize_into.64K", lambda: serialize_into(big, wire)
+    yield "codec.parse_from.64K", lambda: parse_from(wire[:big_end])
+
+def _handle_cases():
+    # handle.* includes one restore() per call; restore.* isolates that cost
+    for cls in SIMULATORS:
+        sim, snap = cls(), staged(cls)[State.OPEN]
+        yield f"restore.{cls.__name__}", lambda sim=sim, snap=snap: sim.restore(snap)
+    for cls in SIMULATORS:
+        for state in State:
+            snap = staged(cls)[state]
+            sim = cls()
+            sim.restore(snap)
+            frame = build_valid_frame(state, sim.cid, random.Random(0))
+            restore, handle = sim.restore, sim.handle
+            def run(restore=restore, handle=handle, snap=snap, frame=frame):
+                restore(snap)
+                handle(frame)
+            yield f"handle.{cls.__name__}.{state.name}", run
+
+def _mutate_cases():
+    for name, payload in OPCODE_PAYLOADS.items():
+        rng = random.Random(0)
+        yield f"mutate.{name}", lambda payload=payload, rng=rng: mutate_payload_core(payload, rng)
+    for name, payload in OPCODE_PAYLOADS.items():
+        sched = OperatorScheduler(random.Random(0))
+        yield f"mutate.scheduled.{name}", lambda payload=payload, sched=sched: sched.mutate(payload)
+
+def _trial_cases():
+    # Real sinks (JSON encoding is part of a trial), closed once the group is done
+    sinks = []
+    def sink():
+        sinks.append(JsonlSink(os.devnull))
+        return sinks[-1]
+    try:
+        for cls in (L2CAPSimulator, CompiledSimulator):
+            fz = StatefulFuzzer(seed=0, sim_cls=cls, anomaly_sink=sink())
+            yield f"trial.{cls.__name__}", fz.run_trial
+        fz = StatefulFuzzer(seed=0, anomaly_sink=sink(), verdict_cache=4096)
+        yield "trial.L2CAPSimulator.verdict_cache", fz.run_trial
+        fz = MuxFuzzer(channels=4096, seed=0, anomaly_sink=sink())
+        yield "trial.MuxFuzzer.4096ch", fz.run_trial
+    finally:
+        for s in sinks:
+            s.close()
+
+def _minimize_cases():
+    for n in MINIMIZE_SIZES:
+        # opt_len 0 with n-3 option bytes: "option length mismatch" at every size
+        payload = bytes([FR, 0x01, 0x00]) + b"\xAA" * (n - 3)
+        reason = "Anomaly: ConfigReq option length mismatch"
+        yield f"minimize.{n}B", lambda payload=payload, reason=reason: \
+            minimize_job(payload, 0x0040, len(payload), "CONFIGURING", reason)
+
+CASE_GROUPS = (_codec_cases, _handle_cases, _mutate_cases, _trial_cases, _minimize_cases)
+
+def measure(fn, repeat: int = 5, min_time: float = 0.2) -> float:
+    """Best-of-repeat seconds per call, with the loop count auto-calibrated."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def run(filter_: str = "", repeat: int = 5, min_time: float = 0.2) -> dict:
+    cases = {}
+    for group in CASE_GROUPS:
+        for name, fn in group():
+            if filter_ and filter_ not in name:
+                continue
+            sec = measure(fn, repeat, min_time)
+            cases[name] = {"ns_per_op": sec * 1e9, "ops_per_sec": 1.0 / sec}
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "cases": cases,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float):
+    """Yield (name, base ns, current ns, ratio, regressed) for cases in both runs."""
+    for name, cur in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        ratio = cur["ns_per_op"] / base["ns_per_op"]
+        yield name, base["ns_per_op"], cur["ns_per_op"], ratio, ratio > 1 + threshold
+
+def unmatched(current: dict, baseline: dict, filter_: str = ""):
+    """(case names only in current, names only in baseline), the latter limited
+    to names --filter would have run; compare() skips both."""
+    cur, base = set(current["cases"]), set(baseline.get("cases", {}))
+    return sorted(cur - base), sorted(n for n in base - cur if filter_ in n)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filter", default="", help="only run cases whose name contains this")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds per timing loop")
+    ap.add_argument("--out", default="results/bench.json")
+    ap.add_argument("--baseline", help="compare against this bench JSON")
+    ap.add_argument("--threshold", type=float, default=0.10,
+                    help="allowed slowdown fraction before a case counts as a regression")
+    ap.add_argument("--save-baseline", help="also write this run as a baseline file")
+    args = ap.parse_args()
+
+    result = run(args.filter, args.repeat, args.min_time)
+    for path in filter(None, (args.out, args.save_baseline)):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+
+    for name, c in result["cases"].items():
+        print(f"{name:<48} {c['ns_per_op']:>12,.0f} ns/op {c['ops_per_sec']:>14,.0f} ops/s")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions, compared = [], 0
+        print(f"\n=== vs {args.baseline} (threshold +{args.threshold:.0%}) ===")
+        for name, base, cur, ratio, bad in compare(result, baseline, args.threshold):
+            print(f"{name:<48} {base:>10,.0f} -> {cur:>10,.0f} ns/op  x{ratio:.2f}{'  REGRESSION' if bad else ''}")
+            compared += 1
+            if bad:
+                regressions.append(name)
+        only_cur, only_base = unmatched(result, baseline, args.filter)
+        if only_cur:
+            print(f"\nNot in baseline ({len(only_cur)}): " + ", ".join(only_cur))
+        if only_base:
+            print(f"\nIn baseline only ({len(only_base)}): " + ", ".join(only_base))
+        if not compared:
+            print("\nNo case in common with the baseline; nothing was compared.")
+            sys.exit(1)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed.")
+            sys.exit(1)
+    print("\nWrote:", args.out)
+
+if __name__ == "__main__":
+    main()
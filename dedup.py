@@ -0,0 +1,89 @@
+# dedup.py
+# In-run anomaly deduplication. An anomaly's signature is (state, reason template,
+# opcode, length bucket); only the first max_per_sig hits of a signature are
+# minimized and written, the rest are just counted.
+import re, hashlib
+from array import array
+
+_VOLATILE = re.compile(r"\b[0-9a-f]{4}\b|\d+")
+
+def reason_template(reason: str) -> str:
+    """Reason with CIDs and numbers blanked, so repeats of one bug compare equal."""
+    return _VOLATILE.sub("#", reason)
+
+def signature(state_name: str, reason: str, payload: bytes, length: int) -> tuple:
+    opcode = payload[0] if payload else None
+    return (state_name, reason_template(reason), opcode, length.bit_length())
+
+def signature_key(sig: tuple) -> str:
+    state, template, opcode, bucket = sig
+    op = "--" if opcode is None else f"{opcode:02x}"
+    return f"{state}|{template}|{op}|len<{1 << bucket}"
+
+class DedupIndex:
+    """Exact per-signature hit counters (memory grows with distinct signatures)."""
+    def __init__(self, max_per_sig: int = 1):
+        self.max_per_sig = max_per_sig
+        self.hits = {}
+        self.admitted = 0
+        self.suppressed = 0
+
+    def admit(self, sig: tuple) -> bool:
+        n = self.hits.get(sig, 0) + 1
+        self.hits[sig] = n
+        if n <= self.max_per_sig:
+            self.admitted += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def summary(self, top: int = 20) -> dict:
+        common = sorted(self.hits.items(), key=lambda kv: -kv[1])[:top]
+        return {
+            "mode": "exact", "max_per_sig": self.max_per_sig,
+            "signatures": len(self.hits), "admitted": self.admitted,
+            "suppressed": self.suppressed,
+            "top_signatures": [[signature_key(s), n] for s, n in common],
+        }
+
+class SketchDedupIndex:
+    """Fixed-memory variant: a count-min sketch (counting Bloom filter) of
+    width x depth 16-bit counters. Counts can only be overestimated, so a
+    signature is never admitted more than max_per_sig times; a rare collision
+    may suppress a new signature early."""
+    def __init__(self, max_per_sig: int = 1, width: int = 1 << 16, depth: int = 4):
+        self.max_per_sig = max_per_sig
+        self.width, self.depth = width, depth
+        self._counts = array("H", bytes(2 * width * depth))
+        self.signatures = 0   # signatures whose estimate was 0 on first sight
+        self.admitted = 0
+        self.suppressed = 0
+
+    def _slots(self, sig: tuple):
+        digest = hashlib.blake2b(repr(sig).encode(), digest_size=4 * self.depth).digest()
+        return [row * self.width + int.from_bytes(digest[4*row:4*row+4], "little") % self.width
+                for row in range(self.depth)]
+
+    def admit(self, sig: tuple) -> bool:
+        slots = self._slots(sig)
+        counts = self._counts
+        est = min(counts[i] for i in slots)
+        if est == 0:
+            self.signatures += 1
+        if est < 0xFFFF:
+            # Conservative update: only raise counters sitting at the minimum
+            for i in slots:
+                if counts[i] == est:
+                    counts[i] = est + 1
+        if est < self.max_per_sig:
+            self.admitted += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def summary(self, top: int = 20) -> dict:
+        return {
+            "mode": "sketch", "max_per_sig": self.max_per_sig,
+            "signatures": self.signatures, "admitted": self.admitted,
+            "suppressed": self.suppressed, "sketch_bytes": len(self._counts) * 2,
+        }
@@ -0,0 +1,103 @@
+# differential.py
+# Lockstep differential fuzzing: each parsed frame goes to the reference
+# simulator and to VulnerableSimulator, and any difference in exception class,
+# response or resulting state is raised as a Divergence anomaly, so the normal
+# fuzzer loop records (and minimizes) it like any other finding. After a
+# divergence the variant is resynchronized from the reference's snapshot.
+#
+#   python run_fuzz.py --differential                     # L2CAPSimulator vs VulnerableSimulator
+#   python run_fuzz.py --differential --engine compiled   # the fast_sim pair
+from l2cap_sim import L2CAPSimulator, Anomaly
+from vuln_sim import VulnerableSimulator
+from fast_sim import CompiledSimulator, CompiledVulnerableSimulator
+
+ASPECTS = ("exception", "response", "state")
+
+class Divergence(Anomaly):
+    """Reference and variant simulators disagreed on one frame."""
+
+def _step(sim, frame):
+    """(exception or None, response, comparable response key)."""
+    try:
+        resp = sim.handle(frame)
+    except Exception as e:
+        return e, None, None
+    return None, resp, None if resp is None else (resp.length, resp.cid, bytes(resp.payload))
+
+def _describe(exc, key, state) -> str:
+    if exc is not None:
+        return f"{type(exc).__name__}: {exc}"
+    return f"->{state.name}" + (f" {key[2].hex()}" if key else "")
+
+class LockstepSimulator:
+    """Drop-in sim_cls that runs REFERENCE and VARIANT side by side. The
+    fuzzer sees the reference (state, coverage, snapshots); restore() loads
+    the same snapshot into both. bus is the variant's events.EventBus."""
+    REFERENCE, VARIANT = L2CAPSimulator, VulnerableSimulator
+
+    def __init__(self):
+        self.ref = self.REFERENCE()
+        self.variant = self.VARIANT()
+        self.stats = dict.fromkeys(("frames", "divergences") + ASPECTS, 0)
+
+    state = property(lambda self: self.ref.state)
+    cid = property(lambda self: self.ref.cid)
+    config_ok = property(lambda self: self.ref.config_ok)
+    bytes_seen = property(lambda self: self.ref.bytes_seen)
+    transitions = property(lambda self: self.ref.transitions)
+    edge_hits = property(lambda self: self.ref.edge_hits)
+    opcode_hits = property(lambda self: self.ref.opcode_hits)
+
+    @property
+    def bus(self):
+        return self.variant.bus
+
+    @bus.setter
+    def bus(self, bus):
+        self.ref.bus = self.variant.bus = bus
+
+    def reset(self):
+        self.ref.reset()
+        self.variant.reset()
+
+    def coverage(self) -> dict:
+        """Reference coverage plus the lockstep counters."""
+        return {**self.ref.coverage(), "differential": dict(self.stats)}
+
+    def snapshot(self):
+        return self.ref.snapshot()
+
+    def restore(self, snap):
+        self.ref.restore(snap)
+        self.variant.restore(snap)
+
+    def handle(self, frame, want_response: bool = True):
+        self.stats["frames"] += 1
+        ref, var = self.ref, self.variant
+        s0 = ref.state
+        a_exc, resp, a_key = _step(ref, frame)
+        b_exc, _, b_key = _step(var, frame)
+        diff = [name for name, x, y in (
+                    ("exception", type(a_exc), type(b_exc)),
+                    ("response", a_key, b_key),
+                    ("state", (ref.state, ref.config_ok, ref.bytes_seen),
+                              (var.state, var.config_ok, var.bytes_seen)))
+                if x != y]
+        if diff:
+            self.stats["divergences"] += 1
+            for name in diff:
+                self.stats[name] += 1
+            msg = (f"Divergence ({', '.join(diff)}) in {s0.name}: "
+                   f"reference {_describe(a_exc, a_key, ref.state)} | "
+                   f"variant {_describe(b_exc, b_key, var.state)}")
+            var.restore(ref.snapshot())
+            raise Divergence(msg)
+        if a_exc is not None:
+            raise a_exc
+        return resp if want_response else None
+
+class CompiledLockstepSimulator(LockstepSimulator):
+    REFERENCE, VARIANT = CompiledSimulator, CompiledVulnerableSimulator
+
+# run_fuzz.py --differential: lockstep pair per --engine
+PAIRS = {"reference": LockstepSimulator, "compiled": CompiledLockstepSimulator}
@@ -0,0 +1,180 @@
+# fast_sim.py
+# Table-driven drop-in for L2CAPSimulator / VulnerableSimulator.
+# Same observable behaviour (states, responses, anomaly messages, transitions),
+# but handle() is one lookup in a precompiled (state, opcode) table over integer
+# state codes, and responses are preallocated per channel.
+#
+#   python fast_sim.py            # lockstep equivalence check + timing
+import random, time
+from l2cap_sim import L2CAPSimulator, State, Anomaly, CP, DT, N_STATES
+from vuln_sim import VulnerableSimulator, FatalFault
+from packet import L2CAPFrame
+from events import EventBus, Finding, DOS, LEAK, BYPASS
+from spec import SPECS, BY_OPCODE, CHECKS, TRANSITIONS, staged
+
+STATES = tuple(State)
+CODE = {s: i for i, s in enumerate(STATES)}
+DISCONNECTED, CONNECTING, CONFIGURING, OPEN, CLOSING = (CODE[s] for s in STATES)
+_NAMES = tuple(s.name for s in STATES)
+
+# Preallocated response payloads, indexed by the rule's response slot
+_RESP_PAYLOADS = tuple(dict.fromkeys(spec.response for spec in SPECS))
+
+# (state, opcode) -> (check or None, next state, response slot), with the
+# checks compiled from spec.py
+_RULES = {(CODE[st], op): (CHECKS[op], CODE[nxt], _RESP_PAYLOADS.index(BY_OPCODE[op].response))
+          for (st, op), nxt in TRANSITIONS.items()}
+# Message for any opcode without a rule in that state
+_WRONG_OPCODE = (
+    "Must start with ConnectReq from DISCONNECTED",
+    "Expected ConnectRsp in CONNECTING",
+    "Expected ConfigReq/ConfigRsp in CONFIGURING",
+    "Only Data or Disconnect allowed when OPEN",
+    "Expected Disconnect in CLOSING",
+)
+
+def _compile():
+    table = [None] * (len(STATES) << 8)
+    for (st, op), rule in _RULES.items():
+        table[(st << 8) | op] = rule
+    return tuple(table)
+
+DISPATCH = _compile()
+_EDGE_CACHE = {}
+
+class CompiledSimulator(L2CAPSimulator):
+    """L2CAPSimulator with a precompiled dispatch table.
+
+    Responses are shared, preallocated frames: treat them as read-only. Pass
+    want_response=False to skip the response entirely."""
+
+    @property
+    def state(self) -> State:
+        return STATES[self._st]
+
+    @state.setter
+    def state(self, value: State):
+        self._st = CODE[value]
+
+    @property
+    def transitions(self):
+        return {(_NAMES[e >> 3], _NAMES[e & 7]) for e in self._edges}
+
+    @transitions.setter
+    def transitions(self, value):
+        # restore() hands in the same few frozensets over and over: convert once
+        key = frozenset(value)
+        edges = _EDGE_CACHE.get(key)
+        if edges is None:
+            edges = _EDGE_CACHE[key] = frozenset(
+                (CODE[State[a]] << 3) | CODE[State[b]] for a, b in key)
+        self._edges = set(edges)
+
+    def _responses(self):
+        self._resp_cid = self.cid
+        self._resps = tuple(L2CAPFrame(length=len(pl), cid=self.cid, payload=pl)
+                            for pl in _RESP_PAYLOADS)
+        return self._resps
+
+    def handle(self, frame: L2CAPFrame, want_response: bool = True):
+        st = self._st
+        if frame.cid != self.cid and st != DISCONNECTED:
+            raise Anomaly(f"Unexpected CID {frame.cid:04x} in {_NAMES[st]}, expected {self.cid:04x}")
+        payload = frame.payload
+        if len(payload) == 0:
+            raise Anomaly("Empty payload not allowed")
+
+        key = (st << 8) | payload[0]
+        self.opcode_hits[key] += 1
+        rule = DISPATCH[key]
+        if rule is None:
+            raise Anomaly(_WRONG_OPCODE[st])
+        check, nxt, slot = rule
+        if check is not None:
+            check(self, frame)
+        self._st = nxt
+        self._edges.add((st << 3) | nxt)
+        self.edge_hits[st * N_STATES + nxt] += 1
+        if not want_response:
+            return None
+        if getattr(self, "_resp_cid", None) != self.cid:
+            return self._responses()[slot]
+        return self._resps[slot]
+
+class CompiledVulnerableSimulator(CompiledSimulator, VulnerableSimulator):
+    """VulnerableSimulator's deliberate flaws on top of the compiled engine."""
+
+    def handle(self, frame: L2CAPFrame, want_response: bool = True):
+        st = self._st
+        if st == CONFIGURING and frame.length > 64:
+            self.bus.emit(Finding(DOS, "CONFIGURING", frame))
+            raise FatalFault("Simulated crash: oversized config frame")
+        if st == OPEN and frame.payload and frame.payload[0] == DT and frame.length == 1:
+            leak = self._secret[:4]
+            self.bus.emit(Finding(LEAK, "OPEN", frame, leak))
+            return L2CAPFrame(length=1 + len(leak), cid=self.cid, payload=bytes([DT]) + leak)
+        if (st == CONNECTING and frame.payload and frame.payload[0] == CP and frame.length == 3
+                and frame.payload[1:3] == b"\x13\x37"):
+            self.bus.emit(Finding(BYPASS, "CONNECTING", frame))
+            self._st = OPEN
+            return L2CAPFrame(length=1, cid=self.cid, payload=bytes([DT]))
+        return CompiledSimulator.handle(self, frame, want_response)
+
+def _observe(sim, frame):
+    try:
+        resp = sim.handle(frame)
+        outcome = ("ok", None if resp is None else (resp.length, resp.cid, bytes(resp.payload)))
+    except Exception as e:
+        outcome = (type(e).__name__, str(e))
+    return (outcome, sim.state, sim.cid, sim.config_ok, sim.bytes_seen, frozenset(sim.transitions),
+            tuple(sim.edge_hits), tuple(sim.opcode_hits))
+
+def _random_frame(rng, cid):
+    n = rng.choice((0, 1, 2, 3, 3, 4, 5, 5, 8, 70))
+    payload = bytes(rng.randrange(256) for _ in range(n))
+    if payload and rng.random() < 0.8:
+        payload = bytes([rng.randrange(1, 8)]) + payload[1:]
+    if n == 3 and rng.random() < 0.3:
+        payload = payload[:1] + rng.choice((b"\x00\x00", b"\x13\x37"))
+    if n >= 3 and rng.random() < 0.5:
+        payload = payload[:2] + bytes([max(0, n - 3 + rng.randrange(-1, 2))]) + payload[3:]
+    length = n + (rng.choice((-1, 1)) if rng.random() < 0.05 else 0)
+    return L2CAPFrame(length=max(0, length), cid=cid if rng.random() < 0.95 else rng.randrange(65536),
+                      payload=payload)
+
+def check_equivalence(pairs=((L2CAPSimulator, CompiledSimulator),
+                             (VulnerableSimulator, CompiledVulnerableSimulator)),
+                      frames: int = 20000, seed: int = 7) -> int:
+    """Drive reference and compiled simulators in lockstep over random sessions;
+    raise AssertionError on the first divergence. Returns frames compared."""
+    rng = random.Random(seed)
+    for ref_cls, fast_cls in pairs:
+        ref, fast = ref_cls(), fast_cls()
+        # Private buses: findings are compared too, and nothing reaches the console
+        ref_log, fast_log = [], []
+        ref.bus, fast.bus = EventBus(ref_log.append), EventBus(fast_log.append)
+        for i in range(frames):
+            if i % 50 == 0:  # jump both to a random staged state now and then
+                snap = staged(ref_cls)[rng.choice(STATES)]
+                ref.restore(snap); fast.restore(snap)
+            frame = _random_frame(rng, ref.cid)
+            a, b = _observe(ref, frame) + (ref_log,), _observe(fast, frame) + (fast_log,)
+            if a != b:
+                raise AssertionError(f"{fast_cls.__name__} diverged on {frame}: {a} != {b}")
+            ref_log.clear(); fast_log.clear()
+    return frames * len(pairs)
+
+def main():
+    n = check_equivalence()
+    print(f"Equivalence OK over {n} frames")
+    frame = L2CAPFrame(length=3, cid=0x0040, payload=bytes([DT, 0x42, 0x42]))
+    for cls in (L2CAPSimulator, CompiledSimulator):
+        sim = cls()
+        sim.restore(staged()[State.OPEN])
+        t0 = time.perf_counter()
+        for _ in range(200000):
+            sim.handle(frame)
+        print(f"{cls.__name__:>20}: {200000 / (time.perf_counter() - t0):,.0f} handle()/s")
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,492 @@
-import json, random, traceback
+import random, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from typing import Dict, Any
-from packet import L2CAPFrame, serialize, parse
-from l2cap_sim import L2CAPSimulator, State, CR, CP, FR, FP, DT, DC, Anomaly
-from mutation import mutate_payload_core, mutate_length_consistent
-
-def build_valid_frame(state: State, cid: int) -> L2CAPFrame:
-    if state == State.DISCONNECTED:
-        payload = bytes([CR, 0x01, 0x00])                 # ConnectReq
-    elif state == State.CONNECTING:
-        payload = bytes([CP, 0x00, 0x00])                 # ConnectRsp OK
-    elif state == State.CONFIGURING:
-        if random.random() < 0.5:
-            opt_value = bytes([0xAA, 0xBB])               # 2-byte option value
-            payload = bytes([FR, 0x01, len(opt_value)]) + opt_value
-        else:
-            payload = bytes([FP, 0x00])                   # ConfigRsp OK
-    elif state == State.OPEN:
-        if random.random() < 0.25:
-            payload = bytes([DC, 0x00])                   # Disconnect
-        else:
-            payload = bytes([DT, 0x42, 0x42])             # Data
-    elif state == State.CLOSING:
-        payload = bytes([DC, 0x00])                       # Disconnect
-    else:
-        payload = bytes([DC, 0x00])
+from packet import L2CAPFrame, serialize_into, parse_from, MAX_FRAME
+from l2cap_sim import L2CAPSimulator, State, Anomaly
+from mutation import mutate_payload_core, mutate_length_consistent, OperatorScheduler, merge_operator_stats
+from dedup import reason_template, signature
+from profiling import merge_profiles
+from events import EventBus, FINDING_REASONS, merge_counts
+from spec import generate, staged
+from verdict_cache import process_cache, merge_cache_stats
+
+def build_valid_frame(state: State, cid: int, rng=random) -> L2CAPFrame:
+    payload = generate(state, rng)          # from the opcode table in spec.py
     return L2CAPFrame(length=len(payload), cid=cid, payload=payload)
 
-def minimize_bytes(b: bytes, test_fn):
-    data = bytearray(b)
-    changed = True
-    while changed and len(data) > 1:
-        changed = False
-        for i in range(1, len(data)):
-            trial = data[:i] + data[i+1:]
+def ddmin(b: bytes, test_fn, keep: int = 1):
+    """Delta-debugging minimizer: drop large chunks first, then finer ones down to
+    single bytes. The first `keep` bytes (the opcode) are never removed and every
+    candidate is tested at most once. Returns (minimized, test executions)."""
+    head, data = bytes(b[:keep]), bytes(b[keep:])
+    seen = {}
+    def test(core: bytes) -> bool:
+        if core not in seen:
             try:
-                if test_fn(bytes(trial)):
-                    data = bytearray(trial)
-                    changed = True
-                    break
+                seen[core] = bool(test_fn(head + core))
             except Exception:
-                pass
-    return bytes(data)
+                seen[core] = False
+        return seen[core]
+
+    n = 2
+    while data:
+        n = min(n, len(data))
+        chunk = -(-len(data) // n)
+        for i in range(0, len(data), chunk):
+            candidate = data[:i] + data[i+chunk:]
+            if test(candidate):
+                data = candidate
+                n = max(n - 1, 2)
+                break
+        else:
+            if n >= len(data):
+                break
+            n *= 2
+    return head + data, len(seen)
+
+def minimize_bytes(b: bytes, test_fn):
+    return ddmin(b, test_fn)[0]
+
+def minimize_job(payload: bytes, cid: int, length: int, state_name: str, reason: str,
+                 sim_cls=L2CAPSimulator, verdict_cache: int = 0):
+    """Minimize one anomaly payload in the state where it fired, keeping the same
+    reason and declared-length skew. Module-level so a worker process can run it.
+    verdict_cache > 0 routes handle() through the process's VerdictCache.
+    Returns (minimized, test executions)."""
+    snap = staged(sim_cls)[State[state_name]]
+    sim = sim_cls()
+    handle = sim.handle
+    if verdict_cache:
+        cache = process_cache(verdict_cache)
+        handle = lambda frame: cache.handle(sim, frame)
+    skew = length - len(payload)
+    wire = memoryview(bytearray(MAX_FRAME))
+    found = []              # events.Finding from simulators that emit them
+    sim.bus = EventBus(found.append)
+    def test_fn(min_payload: bytes):
+        sim.restore(snap)
+        found.clear()
+        try:
+            test_frame = L2CAPFrame(length=len(min_payload) + skew, cid=cid, payload=min_payload)
+            handle(parse_from(wire[:serialize_into(test_frame, wire)])[0])
+        except Anomaly as e:
+            return f"Anomaly: {e}" == reason
+        except Exception as e:
+            return f"Parser/Runtime error: {e}" == reason
+        return bool(found) and FINDING_REASONS.get(found[-1].kind) == reason
+    return ddmin(payload, test_fn)
+
+def minimize_many(jobs):
+    """minimize_job over a batch of argument tuples: one pool task per batch,
+    so the task's IPC cost is shared by its anomalies."""
+    return [minimize_job(*job) for job in jobs]
+
+@dataclass(slots=True)
+class Seed:
+    state: State        # simulator state the frame is sent in
+    prefix: tuple       # (length, payload) frames that walk DISCONNECTED -> state
+    length: int
+    payload: bytes
+    signature: tuple    # (state name, opcode, outcome) this seed first reached
 
 class StatefulFuzzer:
-    def __init__(self, seed: int = 1337):
-        random.seed(seed)
-        self.sim = L2CAPSimulator()
+    def __init__(self, seed: int = 1337, minimize_jobs: int = 0, max_pending: int = 10000,
+                 minimize_batch: int = 64, minimize_batch_ms: float = 20.0,
+                 sim_cls=L2CAPSimulator, anomaly_sink=None, timeline_sink=None,
+                 timeline_every: int = 1, trial_offset: int = 0,
+                 corpus: bool = False, corpus_prob: float = 0.5, corpus_max: int = 4096,
+                 dedup=None, profiler=None, schedule=False, verdict_cache: int = 0):
+        # Private RNG stream so several fuzzers can share a process (or a pool)
+        self.rng = random.Random(seed)
+        self.sim_cls = sim_cls
+        self.sim = sim_cls()
+        # Findings from simulators with deliberate flaws (VulnerableSimulator):
+        # counted per kind on a private bus; a leak/bypass on an accepted frame
+        # is recorded like an anomaly, a DoS record gets "impact": "dos"
+        self.events = EventBus(self._on_finding)
+        self._event = None
+        self.sim.bus = self.events
+        self._wire = memoryview(bytearray(MAX_FRAME))   # reused serialize/parse buffer
+        # verdict_cache.VerdictCache in front of handle() (reference simulators only);
+        # shared with in-process minimize jobs
+        self.verdict_cache = verdict_cache
+        self.verdicts = process_cache(verdict_cache) if verdict_cache else None
         self.stats = {
             "trials": 0, "accepted": 0, "rejected": 0, "anomalies": 0,
-            "visited_states": set(), "visited_transitions": set(),
+            "minimize_execs": 0,
         }
+        # With a sink (sinks.JsonlSink) records are streamed out instead of kept here
         self.anomalies = []
+        self.anomaly_sink = anomaly_sink
+        # Timeline: every anomaly and every first-seen transition is logged, other
+        # accepted trials only every timeline_every-th trial
+        self.timeline = timeline_sink
+        self.timeline_every = max(1, timeline_every)
+        self.trial_offset = trial_offset
+        self._timeline_seen = set()
+        # dedup.DedupIndex / SketchDedupIndex: repeats beyond its limit are only counted
+        self.dedup = dedup
+        # profiling.StageProfiler: per-stage timings of sampled trials (None = off)
+        self.profiler = profiler
+        # mutation.OperatorScheduler: adaptive named operators instead of
+        # mutate_payload_core, credited with first-seen (state, opcode, outcome)
+        self.scheduler = OperatorScheduler(self.rng) if schedule else None
+        self._op_seen = set()
+        # minimize_jobs > 0: run_trial only enqueues, a process pool minimizes.
+        # Records go out in batches of minimize_batch (or whatever is queued
+        # once the oldest is minimize_batch_ms old): per anomaly the fuzzer
+        # process then spends ~7 us at 64 per task, ~55 us at 8 and ~200 us
+        # unbatched, against ~40 us to minimize inline, so batches under ~10
+        # slow trials down (40k trials, seed 1, main-process CPU time)
+        self.minimize_jobs = minimize_jobs
+        self.max_pending = max_pending
+        self.minimize_batch = max(1, minimize_batch)
+        self.minimize_batch_ms = minimize_batch_ms
+        self._pool = None
+        self._batch = []          # (record, minimize_job args) not yet submitted
+        self._batch_t0 = 0.0
+        self._pending = deque()   # (records, future) in discovery order
+        self._n_pending = 0       # records in _pending
+        # Coverage-guided mode: keep inputs that reach a new (state, opcode, outcome)
+        # and replay them with probability corpus_prob, favouring rarely hit ones
+        self.corpus = [] if corpus else None
+        self.corpus_prob = corpus_prob
+        self.corpus_max = corpus_max
+        self._sig_hits = {}
+        self._session = ()         # state-changing frames since DISCONNECTED
+        self._findings = set()     # (state, opcode, reason template)
 
     def run_trial(self):
-        st = self.sim.state
-        base = build_valid_frame(st, self.sim.cid)
-
-        if st in (State.DISCONNECTED, State.CONNECTING, State.CONFIGURING) and random.random() < 0.25:
-            mutated_payload = base.payload
-        else:
-            mutated_payload = mutate_payload_core(base.payload)
-
-        new_len = mutate_length_consistent(base.length, mutated_payload)
-        frame = L2CAPFrame(length=new_len, cid=base.cid, payload=mutated_payload)
+        prof = self.profiler
+        if prof is not None and self.stats["trials"] % prof.every:
+            prof = None                      # not a sampled trial
+        t = prof.start() if prof else 0.0
+        st, frame, t = self.next_frame(prof, t)
 
         self.stats["trials"] += 1
+        parsed = None
         try:
-            data = serialize(frame)
-            parsed = parse(data)
+            end = serialize_into(frame, self._wire)
+            parsed, _ = parse_from(self._wire[:end])
+            if prof:
+                t = prof.lap("serialize/parse", t)
 
             self.stats["accepted"] += 1
-            _ = self.sim.handle(parsed)
+            if self.verdicts is None:
+                _ = self.sim.handle(parsed)
+            else:
+                self.verdicts.handle(self.sim, parsed)
+            if prof:
+                t = prof.lap("sim.handle", t)
 
-            self.stats["visited_states"].add(self.sim.state.name)
-            for tr in list(self.sim.transitions):
-                self.stats["visited_transitions"].add(f"{tr[0]}->{tr[1]}")
+            if self.timeline is not None:
+                self._log_event("Accepted", (st.name, self.sim.state.name))
+            if self.scheduler is not None:
+                self._credit_operator(st, frame, "->" + self.sim.state.name)
+            if self._event is not None:
+                self._record_anomaly(frame, FINDING_REASONS[self._event.kind], st)
+            if self.corpus is not None:
+                self._cover(st, frame, "->" + self.sim.state.name)
+                if self.sim.state != st:
+                    self._session = () if self.sim.state == State.DISCONNECTED else \
+                        self._session + ((frame.length, bytes(frame.payload)),)
+            if prof:
+                prof.lap("bookkeeping", t)
             return True
         except Anomaly as e:
+            if prof:
+                t = prof.lap("sim.handle", t)
             self.stats["anomalies"] += 1
-            self._record_anomaly(frame, f"Anomaly: {str(e)}")
+            if self.timeline is not None:
+                self._log_event("Anomaly")
+            if self.scheduler is not None:
+                self._credit_operator(st, frame, reason_template(f"Anomaly: {str(e)}"))
+            self._record_anomaly(frame, f"Anomaly: {str(e)}", st)
+            if prof:
+                prof.lap("_record_anomaly", t)
             return False
         except Exception as e:
+            if prof:
+                t = prof.lap("serialize/parse" if parsed is None else "sim.handle", t)
             self.stats["rejected"] += 1
-            self._record_anomaly(frame, f"Parser/Runtime error: {str(e)}")
+            if self.timeline is not None:
+                self._log_event("Rejected")
+            if self.scheduler is not None:
+                self._credit_operator(st, frame, reason_template(f"Parser/Runtime error: {str(e)}"))
+            self._record_anomaly(frame, f"Parser/Runtime error: {str(e)}", st)
+            if prof:
+                prof.lap("_record_anomaly", t)
             return False
 
-    def _record_anomaly(self, frame, reason: str):
-        def test_fn(min_payload: bytes):
-            try:
-                test_frame = L2CAPFrame(length=len(min_payload), cid=frame.cid, payload=min_payload)
-                data = serialize(test_frame)
-                parsed = parse(data)
-                sim = L2CAPSimulator()
-                sim.handle(parsed)
-                return False
-            except Exception:
-                return True
-        minimized = minimize_bytes(frame.payload, test_fn)
-        self.anomalies.append({
+    def next_frame(self, prof=None, t: float = 0.0):
+        """Pick and mutate the next frame for the current simulator state.
+        Returns (state, frame, t) with t advanced by the profiler laps."""
+        if self.corpus and self.rng.random() < self.corpus_prob:
+            seed = self._pick_seed()
+            self.sim.restore(staged(self.sim_cls)[seed.state])
+            self._session = seed.prefix
+            st = seed.state
+            base = L2CAPFrame(length=seed.length, cid=self.sim.cid, payload=seed.payload)
+            if prof:
+                t = prof.lap("corpus_seed", t)
+            mutated_payload = self._mutate(base.payload)
+        else:
+            st = self.sim.state
+            base = build_valid_frame(st, self.sim.cid, self.rng)
+            if prof:
+                t = prof.lap("build_valid_frame", t)
+
+            if self.scheduler is None and st in (State.DISCONNECTED, State.CONNECTING, State.CONFIGURING) \
+                    and self.rng.random() < 0.25:
+                mutated_payload = base.payload
+            else:
+                mutated_payload = self._mutate(base.payload)
+        if prof:
+            t = prof.lap("mutate_payload_core", t)
+
+        new_len = mutate_length_consistent(base.length, mutated_payload,
+                                           self.rng if self.scheduler is None else self.scheduler.pool)
+        frame = L2CAPFrame(length=new_len, cid=base.cid, payload=mutated_payload)
+        if prof:
+            t = prof.lap("mutate_length_consistent", t)
+        return st, frame, t
+
+    def _mutate(self, payload: bytes) -> bytes:
+        if self.scheduler is None:
+            return mutate_payload_core(payload, self.rng)
+        return self.scheduler.mutate(payload)
+
+    def _credit_operator(self, st: State, frame, outcome: str):
+        # outcome is "->STATE" for accepted frames, else the reason template
+        sig = (st.name, frame.payload[0] if frame.payload else None, outcome)
+        if sig not in self._op_seen:
+            self._op_seen.add(sig)
+            new_cov = outcome.startswith("->")
+            self.scheduler.credit(new_coverage=new_cov, new_finding=not new_cov)
+
+    def _cover(self, st: State, frame, outcome: str):
+        sig = (st.name, frame.payload[0] if frame.payload else None, outcome)
+        hits = self._sig_hits.get(sig, 0)
+        self._sig_hits[sig] = hits + 1
+        if hits == 0 and len(self.corpus) < self.corpus_max:
+            self.corpus.append(Seed(st, self._session, frame.length, bytes(frame.payload), sig))
+
+    def _pick_seed(self) -> Seed:
+        # Energy ~ 1/hits of the signature the seed owns: rare edges get more trials
+        hits = self._sig_hits
+        weights = [1.0 / hits[s.signature] for s in self.corpus]
+        return self.rng.choices(self.corpus, weights)[0]
+
+    def corpus_entries(self):
+        """Corpus as JSON-ready rows (session prefix + frame)."""
+        for s in self.corpus or ():
+            yield {
+                "state": s.state.name,
+                "prefix_hex": [pl.hex() for _, pl in s.prefix],
+                "length": s.length,
+                "payload_hex": s.payload.hex(),
+                "signature": list(s.signature),
+            }
+
+    def _log_event(self, event: str, transition=None, after: State = None):
+        # after: state following the logged frame (default: the simulator's now)
+        trial = self.trial_offset + self.stats["trials"]
+        if transition is not None:
+            if transition not in self._timeline_seen:
+                self._timeline_seen.add(transition)
+            elif trial % self.timeline_every:
+                return
+        self.timeline.write({
+            "trial": trial,
+            "event": event,
+            "state_after": (after or self.sim.state).name,
+            "transition": list(transition) if transition else None,
+        })
+
+    def _on_finding(self, event):
+        self._event = event
+
+    def _record_anomaly(self, frame, reason: str, st: State, prefix=None):
+        event, self._event = self._event, None
+        finding = (st.name, frame.payload[0] if frame.payload else None, reason_template(reason))
+        self._findings.add(finding)
+        if self.corpus is not None:
+            self._cover(st, frame, finding[2])
+        if self.dedup is not None and \
+                not self.dedup.admit(signature(st.name, reason, frame.payload, frame.length)):
+            return
+        record = {
             "reason": reason,
-            "state_at_input": self.sim.state.name,
+            "state_at_input": st.name,
             "original_payload_hex": frame.payload.hex(),
-            "minimized_payload_hex": minimized.hex(),
+            "minimized_payload_hex": None,
             "cid": frame.cid,
             "length": frame.length,
-        })
+        }
+        if event is not None:
+            record["impact"] = event.kind
+        if prefix:
+            record["session_prefix_hex"] = [pl.hex() for _, pl in prefix]
+        self._minimize(record, self._minimize_args(frame, record["state_at_input"], reason))
+
+    def _minimize(self, record, job):
+        """Minimize inline, or queue record for the pool; _finish emits it."""
+        if not self.minimize_jobs:
+            self._finish(record, minimize_job(*job))
+            return
+        if not self._batch:
+            self._batch_t0 = time.perf_counter()
+        self._batch.append((record, job))
+        if len(self._batch) >= self.minimize_batch or \
+                (time.perf_counter() - self._batch_t0) * 1000 >= self.minimize_batch_ms:
+            self._submit_batch()
+        self._harvest(block=self._n_pending > self.max_pending)
+
+    def _submit_batch(self):
+        if not self._batch:
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.minimize_jobs)
+        records, jobs = zip(*self._batch)
+        self._batch = []
+        self._pending.append((records, self._pool.submit(minimize_many, jobs)))
+        self._n_pending += len(records)
+
+    def _minimize_args(self, frame, state_name: str, reason: str) -> tuple:
+        """Arguments for minimize_job (replays on a fresh sim_cls in state_name)."""
+        return (frame.payload, frame.cid, frame.length, state_name, reason, self.sim_cls,
+                self.verdict_cache)
+
+    def _finish(self, record, result):
+        minimized, execs = result
+        record["minimized_payload_hex"] = minimized.hex()
+        record["minimize_execs"] = execs
+        self.stats["minimize_execs"] += execs
+        if self.anomaly_sink is not None:
+            self.anomaly_sink.write(record)
+        else:
+            self.anomalies.append(record)
+
+    def _harvest(self, block: bool = False):
+        """Emit finished minimizations, keeping discovery order."""
+        while self._pending and (block or self._pending[0][1].done()):
+            records, fut = self._pending.popleft()
+            for record, result in zip(records, fut.result()):
+                self._finish(record, result)
+            self._n_pending -= len(records)
+            block = False
+
+    def drain(self):
+        """Wait for all queued minimizations and stop the pool (call at end of run)."""
+        self._submit_batch()
+        while self._pending:
+            self._harvest(block=True)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def progress(self) -> int:
+        """Distinct transitions plus anomaly signatures seen so far; run_fuzz.py
+        --stop-on-plateau stops once this stops growing."""
+        return len(self._findings) + sum(1 for n in self.sim.edge_hits if n)
+
+    def __getstate__(self):
+        # Checkpoints pickle a drained fuzzer; sinks, the minimize pool and the
+        # wire buffer are process-local and re-attached after loading; so is the
+        # verdict cache (its counters restart on resume)
+        assert not self._pending and not self._batch, "drain() before pickling"
+        state = dict(self.__dict__)
+        for k in ("anomaly_sink", "timeline", "_pool", "_pending", "_batch", "_wire", "verdicts"):
+            state.pop(k)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.anomaly_sink = self.timeline = self._pool = None
+        self._pending, self._batch, self._n_pending = deque(), [], 0
+        self._wire = memoryview(bytearray(MAX_FRAME))
+        self.verdict_cache = state.get("verdict_cache", 0)
+        self.verdicts = process_cache(self.verdict_cache) if self.verdict_cache else None
 
     def summary(self) -> Dict[str, Any]:
+        cov = self.sim.coverage()
         return {
             "trials": self.stats["trials"],
             "accepted": self.stats["accepted"],
             "rejected": self.stats["rejected"],
             "anomalies": self.stats["anomalies"],
-            "visited_states": sorted(self.stats["visited_states"]),
-            "visited_transitions": sorted(self.stats["visited_transitions"]),
+            "minimize_execs": self.stats["minimize_execs"],
+            # Coverage comes from the simulator's O(1) hit-count matrices
+            "visited_states": sorted({t.split("->")[1] for t in cov["transition_hits"]}),
+            "visited_transitions": sorted(cov["transition_hits"]),
+            **cov,
+            "unique_findings": len(self._findings),
+            "impact": dict(self.events.counts),
+            "finding_signatures": sorted(f"{s}|{op}|{r}" for s, op, r in self._findings),
+            **({"corpus_size": len(self.corpus), "coverage_signatures": len(self._sig_hits)}
+               if self.corpus is not None else {}),
+            **({"dedup": self.dedup.summary()} if self.dedup is not None else {}),
+            **({"profile": self.profiler.summary()} if self.profiler is not None else {}),
+            **({"operators": self.scheduler.summary()} if self.scheduler is not None else {}),
+            **({"verdict_cache": self.verdicts.summary()} if self.verdicts is not None else {}),
         }
+
+def derive_seeds(seed: int, n: int):
+    """Independent per-worker seeds derived from one master seed."""
+    master = random.Random(seed)
+    return [master.getrandbits(64) for _ in range(n)]
+
+def merge_summaries(summaries) -> Dict[str, Any]:
+    """Combine summary() dicts from several shards into one."""
+    summaries = list(summaries)
+    counters = ("trials", "accepted", "rejected", "anomalies", "minimize_execs",
+                "cpu_seconds", "corpus_size", "sessions", "handle_calls",
+                "naive_handle_calls", "trie_nodes", "audits")
+    merged = dict.fromkeys(counters, 0)
+    states, transitions, findings = set(), set(), set()
+    for s in summaries:
+        for k in counters:
+            merged[k] += s.get(k, 0)
+        states.update(s.get("visited_states", []))
+        transitions.update(s.get("visited_transitions", []))
+        findings.update(s.get("finding_signatures", []))
+    merged["visited_states"] = sorted(states)
+    merged["visited_transitions"] = sorted(transitions)
+    merged["unique_findings"] = len(findings)
+    merged["finding_signatures"] = sorted(findings)
+    transition_hits, opcode_hits = {}, {}
+    for s in summaries:
+        for k, n in s.get("transition_hits", {}).items():
+            transition_hits[k] = transition_hits.get(k, 0) + n
+        for st, ops in s.get("state_opcode_hits", {}).items():
+            row = opcode_hits.setdefault(st, {})
+            for op, n in ops.items():
+                row[op] = row.get(op, 0) + n
+    merged["transition_hits"] = transition_hits
+    merged["state_opcode_hits"] = opcode_hits
+    profiles = [s["profile"] for s in summaries if "profile" in s]
+    if profiles:
+        merged["profile"] = merge_profiles(profiles)
+    operators = [s["operators"] for s in summaries if "operators" in s]
+    if operators:
+        merged["operators"] = merge_operator_stats(operators)
+    merged["impact"] = merge_counts(s.get("impact", {}) for s in summaries)
+    diffs = [s["differential"] for s in summaries if "differential" in s]
+    if diffs:
+        merged["differential"] = {k: sum(d[k] for d in diffs) for k in diffs[0]}
+    channels = [s["channels"] for s in summaries if "channels" in s]
+    if channels:
+        # Each shard fuzzes its own channel table
+        merged["channels"] = {k: v if k == "bytes_per_channel" else sum(c[k] for c in channels)
+                              for k, v in channels[0].items()}
+    caches = [s["verdict_cache"] for s in summaries if "verdict_cache" in s]
+    if caches:
+        merged["verdict_cache"] = merge_cache_stats(caches)
+    dedups = [s["dedup"] for s in summaries if "dedup" in s]
+    if dedups:
+        # Per-shard indexes: a signature may be admitted once per shard
+        merged["dedup"] = {k: sum(d[k] for d in dedups)
+                           for k in ("signatures", "admitted", "suppressed")}
+    return merged
@@ -17,6 +17,11 @@ FP = 0x04  # ConfigRsp
 DT = 0x05  # Data
 DC = 0x06  # Disconnect
 
+# Dense state indices for the coverage hit-count matrices
+STATE_INDEX = {s: i for i, s in enumerate(State)}
+STATE_NAMES = tuple(s.name for s in State)
+N_STATES = len(STATE_NAMES)
+
 class Anomaly(Exception):
     pass
 
@@ -31,6 +36,37 @@ class L2CAPSimulator:
         self.config_ok = False
         self.bytes_seen = 0
         self.transitions = set()   # (from, to)
+        self._init_coverage()
+
+    def _init_coverage(self):
+        # Hit counts, updated in O(1) per handle(); not part of snapshot()
+        self.edge_hits = [0] * (N_STATES * N_STATES)    # [from * N_STATES + to]
+        self.opcode_hits = [0] * (N_STATES * 256)       # [state * 256 + opcode]
+
+    def coverage(self) -> dict:
+        """Non-zero transition and (state, opcode) hit counts."""
+        transitions, opcodes = {}, {}
+        for i, n in enumerate(self.edge_hits):
+            if n:
+                transitions[f"{STATE_NAMES[i // N_STATES]}->{STATE_NAMES[i % N_STATES]}"] = n
+        for i, n in enumerate(self.opcode_hits):
+            if n:
+                opcodes.setdefault(STATE_NAMES[i >> 8], {})[f"0x{i & 0xFF:02x}"] = n
+        return {"transition_hits": transitions, "state_opcode_hits": opcodes}
+
+    def snapshot(self):
+        """Cheap, immutable copy of the full channel state (see restore/clone)."""
+        return (self.state, self.cid, self.config_ok, self.bytes_seen, frozenset(self.transitions))
+
+    def restore(self, snap):
+        self.state, self.cid, self.config_ok, self.bytes_seen, transitions = snap[:5]
+        self.transitions = set(transitions)
+
+    def clone(self):
+        sim = self.__class__.__new__(self.__class__)
+        sim.restore(self.snapshot())
+        sim._init_coverage()
+        return sim
 
     def _resp(self, opcode: int, payload: bytes) -> L2CAPFrame:
         pl = bytes([opcode]) + payload
@@ -45,6 +81,8 @@ class L2CAPSimulator:
 
         opcode = frame.payload[0]
         s0 = self.state
+        i0 = STATE_INDEX[s0]
+        self.opcode_hits[(i0 << 8) | opcode] += 1
 
         if self.state == State.DISCONNECTED:
             if opcode == CR:
@@ -110,4 +148,5 @@ class L2CAPSimulator:
             raise Anomaly("Unknown state")
 
         self.transitions.add((s0.name, self.state.name))
+        self.edge_hits[i0 * N_STATES + STATE_INDEX[self.state]] += 1
         return resp
@@ -1,20 +1,190 @@
 # make_metrics.py
-import argparse, json, os, collections
+import argparse, json, os, collections, hashlib
+from fuzzer import merge_summaries
+import store
 
 def load_summary(path):
+    # Missing while a run is still going (summary.json is written at the end)
+    if not os.path.exists(path):
+        return {}
     with open(path) as f:
         return json.load(f)
 
-def load_anomalies(path):
-    cases = []
+# Distinct minimized payloads are kept as 64-bit hashes, at most UNIQUE_SKETCH
+# of them: the count is exact up to that many, past it the smallest
+# UNIQUE_SKETCH hashes estimate it (k-minimum-values), so the state file stays
+# bounded however long the run
+UNIQUE_SKETCH = 16384
+
+def _hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+class AnomalyStats:
+    """Running counters over anomalies.jsonl rows; each row is decoded once and
+    only the counters (plus a bounded sketch of the distinct minimized
+    payloads) are kept."""
+    def __init__(self):
+        self.rows = 0
+        self.parser_errors = 0
+        self.protocol_anomalies = 0
+        self.reasons = collections.Counter()
+        self.opcodes = collections.Counter()
+        self.orig_len_sum = self.orig_len_n = 0
+        self.min_len_sum = self.min_len_n = 0
+        self.unique_minimized = set()           # hashes, see UNIQUE_SKETCH
+        self.unique_cutoff = None               # largest hash kept once the sketch is full
+        self.impact = collections.Counter()     # events.Finding kinds ("impact" field)
+
+    def add(self, a: dict):
+        self.rows += 1
+        reason = a.get("reason","")
+        self.reasons[reason.split(":")[0].strip()] += 1
+        if reason.startswith("Parser/Runtime error"):
+            self.parser_errors += 1
+        elif not reason.startswith("Finding"):     # leak/bypass rows are counted in impact
+            self.protocol_anomalies += 1
+        impact = a.get("impact")
+        if impact:
+            self.impact[impact] += 1
+
+        # Lengths and opcode straight from the hex text, no bytes.fromhex
+        ohex = a.get("original_payload_hex") or ""
+        mhex = a.get("minimized_payload_hex") or ""
+        hexp = mhex or ohex
+        if len(hexp) >= 2:
+            try:
+                self.opcodes[int(hexp[:2], 16)] += 1
+            except ValueError:
+                pass
+        if ohex:
+            self.orig_len_sum += len(ohex) // 2
+            self.orig_len_n += 1
+        if mhex:
+            self.min_len_sum += len(mhex) // 2
+            self.min_len_n += 1
+            self._see(_hash64(mhex))
+
+    def _see(self, h: int):
+        if self.unique_cutoff is not None and h > self.unique_cutoff:
+            return
+        self.unique_minimized.add(h)
+        if len(self.unique_minimized) >= 2 * UNIQUE_SKETCH:
+            self._trim()
+
+    def _trim(self):
+        if len(self.unique_minimized) > UNIQUE_SKETCH:
+            kept = sorted(self.unique_minimized)[:UNIQUE_SKETCH]
+            self.unique_minimized, self.unique_cutoff = set(kept), kept[-1]
+
+    def unique_count(self) -> int:
+        """Distinct minimized payloads; an estimate once past UNIQUE_SKETCH."""
+        self._trim()
+        if self.unique_cutoff is None:
+            return len(self.unique_minimized)
+        return round((UNIQUE_SKETCH - 1) * 2 ** 64 / (self.unique_cutoff + 1))
+
+    def merge(self, other: "AnomalyStats"):
+        for k in ("rows", "parser_errors", "protocol_anomalies", "orig_len_sum",
+                  "orig_len_n", "min_len_sum", "min_len_n"):
+            setattr(self, k, getattr(self, k) + getattr(other, k))
+        self.reasons.update(other.reasons)
+        self.opcodes.update(other.opcodes)
+        self.impact.update(other.impact)
+        # Below the smaller cutoff both sketches are complete
+        cutoffs = [c for c in (self.unique_cutoff, other.unique_cutoff) if c is not None]
+        self.unique_cutoff = min(cutoffs) if cutoffs else None
+        self.unique_minimized |= other.unique_minimized
+        if self.unique_cutoff is not None:
+            self.unique_minimized = {h for h in self.unique_minimized if h <= self.unique_cutoff}
+        self._trim()
+
+    def to_dict(self) -> dict:
+        d = dict(vars(self))
+        d["reasons"] = dict(self.reasons)
+        d["opcodes"] = {str(k): v for k, v in self.opcodes.items()}
+        d["impact"] = dict(self.impact)
+        self._trim()
+        d["unique_minimized"] = sorted(self.unique_minimized)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AnomalyStats":
+        st = cls()
+        for k, v in d.items():
+            setattr(st, k, v)
+        st.reasons = collections.Counter(d.get("reasons", {}))
+        st.opcodes = collections.Counter({int(k): v for k, v in d.get("opcodes", {}).items()})
+        st.unique_minimized = set(d.get("unique_minimized", []))
+        st.impact = collections.Counter(d.get("impact", {}))
+        return st
+
+def scan_anomalies(path, stats: AnomalyStats, offset: int = 0) -> int:
+    """Feed rows from byte offset on into stats; returns the offset after the
+    last complete line (a half-written trailing line is left for next time)."""
     if not os.path.exists(path):
-        return cases
-    with open(path) as f:
+        return offset
+    with open(path, "rb") as f:
+        f.seek(offset)
         for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
             line = line.strip()
             if line:
-                cases.append(json.loads(line))
-    return cases
+                stats.add(json.loads(line))
+    return offset
+
+def scan_store(path, stats: AnomalyStats, offset: int = 0) -> int:
+    """As scan_anomalies for a store.py database; offset is the last row id."""
+    if not os.path.exists(path):
+        return offset
+    for offset, rec in store.query(path, after_id=offset):
+        stats.add(rec)
+    return offset
+
+def anomalies_source(d):
+    """(path, scanner) for a results dir: anomalies.db from --store sqlite
+    when it is the newer of the two, else anomalies.jsonl."""
+    jsonl, db = os.path.join(d, "anomalies.jsonl"), os.path.join(d, "anomalies.db")
+    if os.path.exists(db) and (not os.path.exists(jsonl)
+                               or os.path.getmtime(db) >= os.path.getmtime(jsonl)):
+        return os.path.abspath(db), scan_store
+    return os.path.abspath(jsonl), scan_anomalies
+
+def consumed_fingerprint(path, scan, offset) -> str:
+    """Identity of what was read of path up to offset: its inode plus a hash of
+    the first and last 4 KiB before offset (JSONL) or of the row with id offset
+    (store). A file rewritten, truncated or replaced by a new run gets another
+    one even if it has since grown past offset again."""
+    if not os.path.exists(path):
+        return ""
+    h = hashlib.blake2b(str(os.stat(path).st_ino).encode(), digest_size=16)
+    if scan is scan_store:
+        if offset:
+            for i, rec in store.query(path, after_id=offset - 1, limit=1):
+                h.update(json.dumps([i, rec], sort_keys=True).encode())
+    else:
+        with open(path, "rb") as f:
+            h.update(f.read(min(offset, 4096)))
+            start = max(0, offset - 4096)
+            f.seek(start)
+            h.update(f.read(offset - start))
+    return h.hexdigest()
+
+def load_state(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def merge_run_summaries(summaries):
+    """Counters summed, coverage unioned; seconds summed and wall_seconds the
+    longest run (shards of one parallel run overlap in time)."""
+    merged = merge_summaries(summaries)
+    secs = [s["seconds"] for s in summaries if s.get("seconds") is not None]
+    merged["seconds"] = sum(secs) if secs else None
+    merged["wall_seconds"] = max(secs) if secs else None
+    return merged
 
 def opcode_name(op):
     mapping = {1:"CR",2:"CP",3:"FR",4:"FP",5:"DT",6:"DC"}
@@ -22,64 +192,50 @@ def opcode_name(op):
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--results_dir", default="results")
+    ap.add_argument("--results_dir", nargs="+", default=["results"],
+                    help="one or more results dirs (e.g. parallel shards) merged into one report")
     ap.add_argument("--out_dir", default="results")
+    ap.add_argument("--incremental", action="store_true",
+                    help="only read anomaly lines appended since the last call (see --state)")
+    ap.add_argument("--state", default=None,
+                    help="incremental state file (default: <out_dir>/metrics_state.json)")
     args = ap.parse_args()
 
-    summ_path = os.path.join(args.results_dir, "summary.json")
-    anom_path = os.path.join(args.results_dir, "anomalies.jsonl")
-    summary = load_summary(summ_path)
-    anomalies = load_anomalies(anom_path)
+    state_path = args.state or os.path.join(args.out_dir, "metrics_state.json")
+    state = load_state(state_path) if args.incremental else {}
+    summaries, stats = [], AnomalyStats()
+    for d in args.results_dir:
+        summaries.append(load_summary(os.path.join(d, "summary.json")))
+        anom_path, scan = anomalies_source(d)
+        entry = state.get(anom_path, {})
+        offset = entry.get("offset", 0)
+        if offset and entry.get("fingerprint") != consumed_fingerprint(anom_path, scan, offset):
+            entry, offset = {}, 0            # file was rewritten by a new run
+        file_stats = AnomalyStats.from_dict(entry["stats"]) if "stats" in entry else AnomalyStats()
+        offset = scan(anom_path, file_stats, offset)
+        state[anom_path] = {"offset": offset, "fingerprint": consumed_fingerprint(anom_path, scan, offset),
+                            "stats": file_stats.to_dict()}
+        stats.merge(file_stats)
+    summary = merge_run_summaries(summaries) if len(summaries) > 1 else summaries[0]
 
     trials    = summary.get("trials", 0)
     accepted  = summary.get("accepted", 0)
     rejected  = summary.get("rejected", 0)
     anom_cnt  = summary.get("anomalies", 0)
-    seconds   = summary.get("seconds", None)
+    seconds   = summary.get("wall_seconds", summary.get("seconds", None))
 
     accept_rate  = accepted / trials if trials else 0.0
     reject_rate  = rejected / trials if trials else 0.0
     anomaly_rate = anom_cnt / trials if trials else 0.0
     throughput   = trials / seconds if (seconds and seconds > 0) else None
 
-    parser_err = 0
-    proto_anom = 0
-    reason_counter = collections.Counter()
-    opcode_counter = collections.Counter()
-    orig_lens, min_lens = [], []
-
-    for a in anomalies:
-        reason = a.get("reason","")
-        reason_counter[reason.split(":")[0].strip()] += 1
-        if reason.startswith("Parser/Runtime error"):
-            parser_err += 1
-        else:
-            proto_anom += 1
-
-        hexp = a.get("minimized_payload_hex") or a.get("original_payload_hex") or ""
-        try:
-            b = bytes.fromhex(hexp)
-            if len(b) > 0:
-                opcode_counter[b[0]] += 1
-        except Exception:
-            pass
-
-        try:
-            ohex = a.get("original_payload_hex","")
-            mhex = a.get("minimized_payload_hex","")
-            if ohex:
-                orig_lens.append(len(bytes.fromhex(ohex)))
-            if mhex:
-                min_lens.append(len(bytes.fromhex(mhex)))
-        except Exception:
-            pass
-
-    unique_minimized = len(set([
-        a.get("minimized_payload_hex")
-        for a in anomalies if a.get("minimized_payload_hex")
-    ]))
-    mean_orig = sum(orig_lens)/len(orig_lens) if orig_lens else 0.0
-    mean_min  = sum(min_lens)/len(min_lens) if min_lens else 0.0
+    parser_err = stats.parser_errors
+    proto_anom = stats.protocol_anomalies
+    reason_counter = stats.reasons
+    opcode_counter = stats.opcodes
+    unique_minimized = stats.unique_count()
+    mean_orig = stats.orig_len_sum/stats.orig_len_n if stats.orig_len_n else 0.0
+    mean_min  = stats.min_len_sum/stats.min_len_n if stats.min_len_n else 0.0
     reduction = (1 - (mean_min/mean_orig)) if mean_orig > 0 else 0.0
 
     metrics = {
@@ -97,6 +253,7 @@ def main():
         "parser_errors": parser_err,
         "protocol_anomalies": proto_anom,
         "unique_minimized_payloads": unique_minimized,
+        "unique_minimized_estimated": stats.unique_cutoff is not None,
         "mean_original_payload_len": mean_orig,
         "mean_minimized_payload_len": mean_min,
         "avg_length_reduction_fraction": reduction,
@@ -106,13 +263,27 @@ def main():
             for k, v in opcode_counter.most_common()
         ],
     }
+    # Simulated impact: every finding the fuzzed simulator emitted (summary)
+    # and the ones that made it into the stored anomalies
+    events = summary.get("impact", {})
+    metrics["impact"] = {"events": events, "recorded": dict(stats.impact)}
+    if "profile" in summary:
+        metrics["profile"] = summary["profile"]
+    if len(args.results_dir) > 1:
+        metrics["results_dirs"] = args.results_dir
 
     os.makedirs(args.out_dir, exist_ok=True)
     with open(os.path.join(args.out_dir, "metrics.json"), "w") as f:
         json.dump(metrics, f, indent=2)
+    if args.incremental:
+        with open(state_path, "w") as f:
+            json.dump(state, f)
 
     md = []
     md.append("# Fuzzing Metrics\n")
+    if len(args.results_dir) > 1:
+        md.append(f"Merged from {len(args.results_dir)} results dirs: "
+                  + ", ".join(f"`{d}`" for d in args.results_dir) + "\n")
     md.append(f"- Trials: **{trials}**")
     md.append(f"- Accepted: **{accepted}** ({accept_rate:.2%})")
     md.append(f"- Rejected: **{rejected}** ({reject_rate:.2%})")
@@ -122,10 +293,15 @@ def main():
     md.append("")
     md.append(f"- Parser errors: **{parser_err}**")
     md.append(f"- Protocol anomalies: **{proto_anom}**")
-    md.append(f"- Unique minimized payloads: **{unique_minimized}**")
+    md.append(f"- Unique minimized payloads: **{unique_minimized}**"
+              + (" (estimated)" if stats.unique_cutoff is not None else ""))
     md.append(f"- Avg original payload length: **{mean_orig:.2f}**")
     md.append(f"- Avg minimized payload length: **{mean_min:.2f}** (reduction {reduction:.1%})")
     md.append("")
+    md.append("## Simulated impact (VulnerableSimulator engines)")
+    for kind in ("dos", "leak", "bypass"):
+        md.append(f"- {kind}: {events.get(kind, 0)} events, {stats.impact.get(kind, 0)} recorded")
+    md.append("")
     md.append("## States & Transitions")
     md.append(f"- States visited: `{summary.get('visited_states', [])}`")
     md.append(f"- Transitions visited: `{summary.get('visited_transitions', [])}`")
@@ -137,6 +313,17 @@ def main():
     md.append("## Opcodes in anomalies (by count)")
     for item in metrics["opcodes_in_anomalies"]:
         md.append(f"- {item['name']} (0x{item['opcode']:02x}): {item['count']}")
+    if "profile" in metrics:
+        prof = metrics["profile"]
+        md.append("")
+        md.append("## Stage breakdown (run_fuzz.py --profile)")
+        md.append(f"Sampled {prof['sampled_trials']} trials (every {prof['sample_every']}).")
+        md.append("")
+        md.append("| Stage | Calls | Seconds | µs/call | Share |")
+        md.append("|---|---:|---:|---:|---:|")
+        for name, st in prof["stages"].items():
+            md.append(f"| {name} | {st['calls']} | {st['seconds']:.4f} | "
+                      f"{st['us_per_call']:.2f} | {st['share']:.1%} |")
     with open(os.path.join(args.out_dir, "metrics.md"), "w") as f:
         f.write("\n".join(md))
 
@@ -2,9 +2,13 @@
 # Usage:
 #   pip install matplotlib
 #   python make_plots.py --results_dir results
+# Anomalies are read from anomalies.db instead of anomalies.jsonl when a
+# --store sqlite run left the newer of the two (as make_metrics.py does).
 
 import argparse, os, json, collections
 import matplotlib.pyplot as plt
+import store
+from make_metrics import anomalies_source, scan_store
 
 def load_json(path):
     with open(path) as f:
@@ -49,7 +53,7 @@ def main():
     args = ap.parse_args()
 
     metrics_path = os.path.join(args.results_dir, "metrics.json")
-    anomalies_path = os.path.join(args.results_dir, "anomalies.jsonl")
+    anomalies_path, scan = anomalies_source(args.results_dir)
     summary_path = os.path.join(args.results_dir, "summary.json")
     timeline_path = os.path.join(args.results_dir, "timeline.jsonl")
 
@@ -59,7 +63,8 @@ def main():
         raise SystemExit(f"Missing {anomalies_path}. Run your fuzzer first.")
 
     metrics = load_json(metrics_path)
-    anomalies = load_jsonl(anomalies_path)
+    anomalies = [rec for _, rec in store.query(anomalies_path)] if scan is scan_store \
+        else load_jsonl(anomalies_path)
 
     # -------- Bar: Top anomaly reasons --------
     reasons = collections.Counter()
@@ -1,53 +1,242 @@
 import random
-# opcodes
-CR, CP, FR, FP, DT, DC = 0x01, 0x02, 0x03, 0x04, 0x05, 0x06
+from array import array
+from bisect import bisect
+from dataclasses import dataclass
+from typing import Callable
+from spec import MUTATORS, VALUE_FIELDS, LENGTH_FIELDS, SHORTABLE_FIELDS, flip_any
 
-def mutate_length_consistent(length: int, payload: bytes) -> int:
+def mutate_length_consistent(length: int, payload: bytes, rng=random) -> int:
     # Keep declared length consistent 98% of the time
-    if random.random() < 0.98:
+    if rng.random() < 0.98:
         return len(payload)
     # Tiny mismatch 2% of the time to tickle parser edges
-    delta = random.choice([-1, 1])
+    delta = rng.choice([-1, 1])
     return max(0, min(65535, len(payload) + delta))
 
-def mutate_payload_core(payload: bytes) -> bytes:
+def mutate_payload_core(payload: bytes, rng=random) -> bytes:
     if len(payload) <= 1:
         return payload
     # Allow progress more often, but still explore
-    if random.random() < 0.15:
+    if rng.random() < 0.15:
         return payload
-
+    # Field-aware mutator compiled from the opcode's spec.py entry: keep a
+    # valid value valid most runs, skew a length-of field, cut a field short;
+    # otherwise flip one core byte
     opcode = payload[0]
-    core = bytearray(payload[1:])
-
-    # CP: keep status OK most runs so we reach CONFIGURING/OPEN
-    if opcode == CP:
-        if random.random() < 0.70:
-            return bytes([opcode]) + bytes(core)
-        # 30%: flip exactly one status byte (protocol anomaly chance)
-        i = 0 if random.random() < 0.5 else 1
-        core[i] = (core[i] + 1) % 256
-        return bytes([opcode]) + bytes(core)
-
-    # FR: prefer value flips; mismatch opt_len sometimes
-    if opcode == FR and len(core) >= 2:
-        opt_type = core[0]
-        opt_len  = core[1]
-        opt_val  = bytearray(core[2:2+opt_len])
-        if len(opt_val) > 0:
-            j = random.randrange(len(opt_val))
-            opt_val[j] ^= 0x01  # minimal, structured mutation
-        keep_len = random.random() < 0.70  # 30%: provoke length mismatch anomaly
-        new_len = len(opt_val) if keep_len else (len(opt_val) ^ 1) & 0xFF
-        core = bytearray([opt_type, new_len]) + opt_val
-        return bytes([opcode]) + bytes(core)
-
-    # OPEN state payloads (DT): ~20% chance to zero out data → "Data too short"
-    if opcode == DT and len(core) > 0 and random.random() < 0.20:
-        core = bytearray(b"")  # trigger simulator's "Data too short" path
-
-    # default: flip one core byte
-    k = random.randrange(len(core)) if len(core) > 0 else 0
-    if len(core) > 0:
-        core[k] ^= 0x01
-    return bytes([opcode]) + bytes(core)
+    return MUTATORS.get(opcode, flip_any)(opcode, bytearray(payload[1:]), rng)
+
+# ---------------------------------------------------------------------------
+# Named operators + adaptive scheduler (run_fuzz.py --schedule)
+# mutate_payload_core above stays the default; with a scheduler each frame is
+# mutated by one named operator, picked with weights that follow how often the
+# operator has produced new coverage or new anomaly signatures (MOpt-style).
+class RandomPool:
+    """The scheduler's randomness, drawn from rng in batches of `size` (one
+    randbytes() call per batch of floats or bytes) and handed out from a list
+    plus an index, so it pickles (run_fuzz.py checkpoints) mid-batch as plain
+    data. It is not faster: a draw costs a few times a random.Random.random()
+    call (bench.py mutate.scheduled.*). Exposes the methods the mutators use
+    (random, randrange, choice, byte), so it can stand in as rng."""
+    def __init__(self, rng=random, size: int = 4096):
+        self.rng = rng
+        self.size = size
+        self._floats, self._fi = [], 0
+        self._bytes, self._bi = b"", 0
+
+    def random(self) -> float:
+        i = self._fi
+        if i == len(self._floats):
+            self._floats = [(x >> 11) * 2.0 ** -53
+                            for x in array("Q", self.rng.randbytes(8 * self.size))]
+            i = 0
+        self._fi = i + 1
+        return self._floats[i]
+
+    def byte(self) -> int:
+        i = self._bi
+        if i == len(self._bytes):
+            self._bytes = self.rng.randbytes(self.size)
+            i = 0
+        self._bi = i + 1
+        return self._bytes[i]
+
+    def randrange(self, n: int) -> int:
+        return int(self.random() * n)
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+@dataclass(slots=True)
+class Operator:
+    name: str
+    applies: Callable[[int, int], bool]      # (opcode, len(core)) -> bool
+    fn: Callable                              # (opcode, core bytearray, pool) -> payload
+
+def _passthrough(op, core, r):
+    return bytes([op]) + core
+
+# Field operators find their field through spec.py's tables, so they apply to
+# every opcode whose spec has such a field
+def _value_bump(op, core, r):
+    off, size = VALUE_FIELDS[op]
+    i = off + int(r.random() * size)
+    core[i] = (core[i] + 1) % 256
+    return bytes([op]) + core
+
+def _length_of(op, core, r, mismatch):
+    off = LENGTH_FIELDS[op]
+    val = bytearray(core[off+1:off+1+core[off]])
+    if val:
+        val[int(r.random() * len(val))] ^= 0x01
+    new_len = (len(val) ^ 1) & 0xFF if mismatch else len(val)
+    return bytes([op]) + core[:off] + bytes([new_len]) + val
+
+def _length_of_value_flip(op, core, r):
+    return _length_of(op, core, r, False)
+
+def _length_of_mismatch(op, core, r):
+    return _length_of(op, core, r, True)
+
+def _field_truncate(op, core, r):
+    return bytes([op]) + core[:SHORTABLE_FIELDS[op]]
+
+def _bitflip(op, core, r):
+    core[int(r.random() * len(core))] ^= 0x01
+    return bytes([op]) + core
+
+def _byte_random(op, core, r):
+    core[int(r.random() * len(core))] = r.byte()
+    return bytes([op]) + core
+
+def _extend(op, core, r):
+    return bytes([op]) + core + bytes([r.byte()])
+
+def _truncate(op, core, r):
+    return bytes([op]) + core[:int(r.random() * len(core))]
+
+# Applicability predicates: (opcode, len(core)) -> bool. Operators are plain
+# module-level functions so a scheduler pickles into run_fuzz.py checkpoints.
+def _always(op, n):
+    return True
+
+def _has_core(op, n):
+    return n > 0
+
+def _has_value(op, n):
+    f = VALUE_FIELDS.get(op)
+    return f is not None and n >= f[0] + f[1]
+
+def _has_length_of(op, n):
+    off = LENGTH_FIELDS.get(op)
+    return off is not None and n > off
+
+def _is_shortable(op, n):
+    off = SHORTABLE_FIELDS.get(op)
+    return off is not None and n > off
+
+OPERATORS = (
+    Operator("passthrough", _always, _passthrough),
+    Operator("value_bump", _has_value, _value_bump),
+    Operator("length_of_value_flip", _has_length_of, _length_of_value_flip),
+    Operator("length_of_mismatch", _has_length_of, _length_of_mismatch),
+    Operator("field_truncate", _is_shortable, _field_truncate),
+    Operator("bitflip", _has_core, _bitflip),
+    Operator("byte_random", _has_core, _byte_random),
+    Operator("extend", _always, _extend),
+    Operator("truncate", _has_core, _truncate),
+)
+
+# Largest core length any predicate above distinguishes
+_N_BUCKET = max([2] + [off + size for off, size in VALUE_FIELDS.values()]
+                + [off + 1 for off in (*LENGTH_FIELDS.values(), *SHORTABLE_FIELDS.values())])
+
+class OperatorScheduler:
+    """Picks one applicable operator per payload. Every `period` picks each
+    operator is reweighted to floor + its yield (new coverage + new findings
+    per use) relative to the best operator's, so operators that pay off are
+    favoured while none starves."""
+    def __init__(self, rng=random, operators=OPERATORS, period: int = 256,
+                 floor: float = 0.05, pool_size: int = 4096):
+        self.pool = RandomPool(rng, pool_size)
+        self.operators = operators
+        self.period = period
+        self.floor = floor
+        n = len(operators)
+        self.uses = [0] * n
+        self.coverage = [0] * n
+        self.findings = [0] * n
+        self.weights = [1.0] * n
+        self._tables = {}       # (opcode, len(core) bucket) -> (op indices, cumulative weights, fns)
+        self._until_reweight = period
+        self.last = None        # operator index behind the last mutate() call
+
+    def _table(self, key):
+        opcode, n = key
+        idx = [i for i, o in enumerate(self.operators) if o.applies(opcode, n)]
+        cum, acc = [], 0.0
+        for i in idx:
+            acc += self.weights[i]
+            cum.append(acc)
+        t = self._tables[key] = (idx, cum, [self.operators[i].fn for i in idx])
+        return t
+
+    def mutate(self, payload: bytes) -> bytes:
+        n = len(payload) - 1
+        if n <= 0:
+            self.last = None
+            return payload
+        opcode = payload[0]
+        key = (opcode, n if n < _N_BUCKET else _N_BUCKET)  # applicability is the same for n >= _N_BUCKET
+        idx, cum, fns = self._tables.get(key) or self._table(key)
+        j = bisect(cum, self.pool.random() * cum[-1])    # random() < 1, so j < len(cum)
+        self.last = i = idx[j]
+        self.uses[i] += 1
+        self._until_reweight -= 1
+        if not self._until_reweight:
+            self._until_reweight = self.period
+            self._reweight()
+        return fns[j](opcode, bytearray(payload[1:]), self.pool)
+
+    def credit(self, new_coverage: bool = False, new_finding: bool = False):
+        """Book the outcome of the frame produced by the last mutate()."""
+        i = self.last
+        if i is None:
+            return
+        self.coverage[i] += new_coverage
+        self.findings[i] += new_finding
+
+    def _reweight(self):
+        yields = [(c + f) / u if u else 0.0
+                  for u, c, f in zip(self.uses, self.coverage, self.findings)]
+        best = max(yields)
+        if best > 0:
+            self.weights = [self.floor + y / best for y in yields]
+            self._tables.clear()
+
+    def summary(self) -> dict:
+        total = sum(self.weights)
+        return {
+            o.name: {
+                "uses": self.uses[i],
+                "new_coverage": self.coverage[i],
+                "new_findings": self.findings[i],
+                "yield": (self.coverage[i] + self.findings[i]) / self.uses[i] if self.uses[i] else 0.0,
+                "weight": self.weights[i] / total,
+            }
+            for i, o in enumerate(self.operators)
+        }
+
+def merge_operator_stats(stats) -> dict:
+    """Combine OperatorScheduler.summary() dicts from several shards."""
+    stats = list(stats)
+    merged = {}
+    for s in stats:
+        for name, st in s.items():
+            m = merged.setdefault(name, {"uses": 0, "new_coverage": 0, "new_findings": 0, "weights": []})
+            for k in ("uses", "new_coverage", "new_findings"):
+                m[k] += st[k]
+            m["weights"].append(st["weight"])
+    for m in merged.values():
+        m["yield"] = (m["new_coverage"] + m["new_findings"]) / m["uses"] if m["uses"] else 0.0
+        m["weight"] = sum(m.pop("weights")) / max(1, len(stats))
+    return merged
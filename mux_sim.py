@@ -0,0 +1,305 @@
+# mux_sim.py
+# Many L2CAP channels in one simulator. Per-channel state lives in array-backed
+# columns indexed by a slot number, a 64K-entry CID -> slot index routes each
+# frame by frame.cid, and a ConnectReq on a free CID allocates a slot (freed
+# again when the channel returns to DISCONNECTED). Each channel follows the
+# same rules and messages as L2CAPSimulator, via fast_sim's dispatch table.
+#
+#   python mux_sim.py            # lockstep check against per-CID L2CAPSimulators + timing
+#   python run_fuzz.py --channels 4096   # MuxFuzzer: trials interleaved over 4096 CIDs
+import random, time
+from array import array
+from functools import partial
+from l2cap_sim import L2CAPSimulator, State, Anomaly, N_STATES
+from fast_sim import STATES, DISCONNECTED, DISPATCH, _WRONG_OPCODE, _NAMES, _RESP_PAYLOADS, \
+    CompiledSimulator
+from fuzzer import StatefulFuzzer
+from packet import L2CAPFrame
+from spec import generate
+
+FIRST_DYNAMIC_CID = 0x0040       # CIDs below are fixed/reserved channels
+DEFAULT_CID = FIRST_DYNAMIC_CID
+# Column bytes per allocated channel: state, config_ok, bytes_seen, cid
+CHANNEL_BYTES = 1 + 1 + 8 + 2
+
+class MuxSimulator(L2CAPSimulator):
+    """L2CAPSimulator over up to max_channels channels at once.
+
+    state/cid/config_ok/bytes_seen describe the focused channel (focus(cid)),
+    so the single-channel fuzzer code keeps working; handle() routes by
+    frame.cid regardless of focus. Coverage counters and transitions are
+    shared by all channels. Cross-channel invariants (reserved CIDs, channel
+    capacity, table consistency via audit()) raise Anomaly."""
+
+    def __init__(self, max_channels: int = 65535 - FIRST_DYNAMIC_CID + 1):
+        self.max_channels = max_channels
+        self.reset()
+
+    def reset(self):
+        self._index = array("H", bytes(2 * 65536))     # cid -> slot + 1 (0 = no channel)
+        self._state = array("B")
+        self._config = array("B")
+        self._bytes = array("Q")
+        self._cid = array("H")
+        self._free = array("H")                        # released slots, reused first
+        self.live = 0
+        self.peak = 0
+        self._focus = DEFAULT_CID
+        self.transitions = set()
+        self._init_coverage()
+
+    # -- focused-channel view (what L2CAPSimulator callers read) --
+    def focus(self, cid: int):
+        self._focus = cid
+
+    @property
+    def cid(self) -> int:
+        return self._focus
+
+    @cid.setter
+    def cid(self, value: int):
+        self._focus = value
+
+    def _slot(self, cid: int):
+        s = self._index[cid]
+        return s - 1 if s else None
+
+    @property
+    def state(self) -> State:
+        s = self._slot(self._focus)
+        return STATES[self._state[s]] if s is not None else State.DISCONNECTED
+
+    @property
+    def config_ok(self) -> bool:
+        s = self._slot(self._focus)
+        return bool(self._config[s]) if s is not None else False
+
+    @property
+    def bytes_seen(self) -> int:
+        s = self._slot(self._focus)
+        return self._bytes[s] if s is not None else 0
+
+    def channel_state(self, cid: int) -> State:
+        s = self._slot(cid)
+        return STATES[self._state[s]] if s is not None else State.DISCONNECTED
+
+    # -- snapshots cover the whole channel table --
+    def snapshot(self):
+        return ("mux", self._index.tobytes(), self._state.tobytes(), self._config.tobytes(),
+                self._bytes.tobytes(), self._cid.tobytes(), self._free.tobytes(),
+                self.live, self._focus, frozenset(self.transitions))
+
+    def restore(self, snap):
+        (_, index, state, config, bytes_, cids, free, self.live,
+         self._focus, transitions) = snap
+        self._index = array("H", index)
+        self._state, self._config = array("B", state), array("B", config)
+        self._bytes, self._cid, self._free = array("Q", bytes_), array("H", cids), array("H", free)
+        self.transitions = set(transitions)
+        self.peak = max(getattr(self, "peak", 0), self.live)
+
+    def clone(self):
+        sim = self.__class__.__new__(self.__class__)
+        sim.max_channels = self.max_channels
+        sim.restore(self.snapshot())
+        sim._init_coverage()
+        return sim
+
+    def _allocate(self, cid: int) -> int:
+        if self.live >= self.max_channels:
+            raise Anomaly(f"No free channel for CID {cid:04x} ({self.live} in use)")
+        if self._free:
+            s = self._free.pop()
+            self._state[s] = DISCONNECTED
+            self._config[s] = 0
+            self._bytes[s] = 0
+            self._cid[s] = cid
+        else:
+            s = len(self._state)
+            self._state.append(DISCONNECTED)
+            self._config.append(0)
+            self._bytes.append(0)
+            self._cid.append(cid)
+        self._index[cid] = s + 1
+        self.live += 1
+        if self.live > self.peak:
+            self.peak = self.live
+        return s
+
+    def _release(self, s: int):
+        self._index[self._cid[s]] = 0
+        self._free.append(s)
+        self.live -= 1
+
+    def handle(self, frame: L2CAPFrame, want_response: bool = True):
+        cid = frame.cid
+        if cid < FIRST_DYNAMIC_CID:
+            raise Anomaly(f"Frame on reserved CID {cid:04x}")
+        payload = frame.payload
+        if len(payload) == 0:
+            raise Anomaly("Empty payload not allowed")
+        s = self._index[cid] - 1
+        st = self._state[s] if s >= 0 else DISCONNECTED
+
+        key = (st << 8) | payload[0]
+        self.opcode_hits[key] += 1
+        rule = DISPATCH[key]
+        if rule is None:
+            raise Anomaly(_WRONG_OPCODE[st])
+        check, nxt, resp = rule
+        if check is not None:
+            # fast_sim checks update config_ok/bytes_seen on the object they get:
+            # run them on a scratch register and copy the result into the columns
+            reg = self._reg
+            reg.config_ok = bool(self._config[s]) if s >= 0 else False
+            reg.bytes_seen = self._bytes[s] if s >= 0 else 0
+            check(reg, frame)
+        if s < 0:
+            s = self._allocate(cid)              # only CR leaves DISCONNECTED
+        if check is not None:
+            self._config[s] = reg.config_ok
+            self._bytes[s] = reg.bytes_seen
+        self._state[s] = nxt
+        self.transitions.add((_NAMES[st], _NAMES[nxt]))
+        self.edge_hits[st * N_STATES + nxt] += 1
+        if nxt == DISCONNECTED:
+            self._release(s)
+        if not want_response:
+            return None
+        pl = _RESP_PAYLOADS[resp]
+        return L2CAPFrame(length=len(pl), cid=cid, payload=pl)
+
+    def audit(self):
+        """Full consistency check of the channel table (O(channels)); raises
+        Anomaly on the first cross-channel invariant violation."""
+        free = set(self._free)
+        live = 0
+        for s, cid in enumerate(self._cid):
+            if s in free:
+                continue
+            live += 1
+            if cid < FIRST_DYNAMIC_CID:
+                raise Anomaly(f"Cross-channel invariant: slot {s} holds reserved CID {cid:04x}")
+            if self._index[cid] != s + 1:
+                raise Anomaly(f"Cross-channel invariant: CID {cid:04x} maps to slot "
+                              f"{self._index[cid] - 1}, expected {s}")
+            if self._state[s] == DISCONNECTED:
+                raise Anomaly(f"Cross-channel invariant: CID {cid:04x} allocated while DISCONNECTED")
+        if live != self.live or live > self.max_channels:
+            raise Anomaly(f"Cross-channel invariant: {live} channels in table, {self.live} counted")
+        if sum(1 for v in self._index if v) != live:
+            raise Anomaly("Cross-channel invariant: CID index and channel table disagree")
+
+    def memory(self) -> dict:
+        slots = len(self._state)
+        return {"live_channels": self.live, "peak_channels": self.peak, "slots": slots,
+                "bytes_per_channel": CHANNEL_BYTES,
+                "table_bytes": slots * CHANNEL_BYTES + len(self._free) * 2,
+                "index_bytes": len(self._index) * self._index.itemsize}
+
+class _Register:
+    __slots__ = ("config_ok", "bytes_seen")
+
+MuxSimulator._reg = _Register()
+
+class MuxFuzzer(StatefulFuzzer):
+    """StatefulFuzzer over one MuxSimulator: every trial focuses a random CID out
+    of `channels`, so frames of thousands of channels interleave in one table.
+    audit() runs every audit_every trials; a violation is recorded as an anomaly
+    on the frame that preceded it. max_open < channels exercises the capacity
+    limit. Session corpus mode is not supported (staged restores reset every
+    channel)."""
+    def __init__(self, channels: int = 1024, max_open: int = None,
+                 audit_every: int = 4096, **kw):
+        if kw.get("corpus"):
+            raise ValueError("MuxFuzzer does not support corpus mode")
+        kw["sim_cls"] = partial(MuxSimulator, max_open or channels)
+        super().__init__(**kw)
+        self.channels = channels
+        self.audit_every = audit_every
+        self.stats["audits"] = 0
+        self._last = None
+
+    def run_trial(self):
+        if self.channels > 1:
+            self.sim.focus(FIRST_DYNAMIC_CID + self.rng.randrange(self.channels))
+        ok = super().run_trial()
+        if self.audit_every and self.stats["trials"] % self.audit_every == 0:
+            self.audit()
+        return ok
+
+    def next_frame(self, prof=None, t: float = 0.0):
+        st, frame, t = super().next_frame(prof, t)
+        self._last = (st, frame)
+        return st, frame, t
+
+    def audit(self):
+        self.stats["audits"] += 1
+        try:
+            self.sim.audit()
+        except Anomaly as e:
+            self.stats["anomalies"] += 1
+            if self._last is not None:
+                st, frame = self._last
+                self._record_anomaly(frame, f"Anomaly: {e}", st)
+
+    def _minimize_args(self, frame, state_name: str, reason: str) -> tuple:
+        # Per-channel reasons replay on a single-channel sim, on its default CID
+        return (frame.payload, DEFAULT_CID, frame.length, state_name, reason, CompiledSimulator)
+
+    def summary(self):
+        return {**super().summary(), "audits": self.stats["audits"],
+                "channels": {"fuzzed": self.channels, **self.sim.memory()}}
+
+def check_equivalence(frames: int = 50000, channels: int = 64, seed: int = 11) -> int:
+    """Interleave random frames over many CIDs through one MuxSimulator and one
+    L2CAPSimulator per CID; raise AssertionError on the first divergence."""
+    rng = random.Random(seed)
+    mux, refs = MuxSimulator(), {}
+    cids = [FIRST_DYNAMIC_CID + i for i in range(channels)]
+    for i in range(frames):
+        cid = rng.choice(cids)
+        ref = refs.get(cid)
+        if ref is None:
+            ref = refs[cid] = L2CAPSimulator()
+            ref.cid = cid
+        # valid frames come from spec.py (Data and Disconnect both in OPEN)
+        payload = generate(ref.state, rng) if rng.random() < 0.7 else \
+            bytes(rng.randrange(8) for _ in range(rng.choice((0, 1, 2, 3, 4))))
+        frame = L2CAPFrame(length=len(payload), cid=cid, payload=payload)
+        out = []
+        for sim in (ref, mux):
+            try:
+                resp = sim.handle(frame)
+                out.append(("ok", resp.length, resp.cid, bytes(resp.payload)))
+            except Anomaly as e:
+                out.append(("anomaly", str(e)))
+        if out[0] != out[1] or ref.state != mux.channel_state(cid):
+            raise AssertionError(f"diverged on {frame}: {out[0]} != {out[1]}")
+        if i % 5000 == 0:
+            mux.audit()
+    mux.audit()
+    live = sum(1 for r in refs.values() if r.state != State.DISCONNECTED)
+    if live != mux.live:
+        raise AssertionError(f"{mux.live} live channels, expected {live}")
+    return frames
+
+def main():
+    n = check_equivalence()
+    print(f"Equivalence: OK ({n} interleaved frames over 64 CIDs)")
+    sim = MuxSimulator()
+    steps = [bytes([0x01, 0x01, 0x00]), bytes([0x02, 0, 0]), bytes([0x04, 0x00])]
+    channels = 20000
+    t0 = time.perf_counter()
+    for pl in steps:                      # open `channels` channels, interleaved
+        for c in range(channels):
+            sim.handle(L2CAPFrame(len(pl), FIRST_DYNAMIC_CID + c, pl), want_response=False)
+    dt = time.perf_counter() - t0
+    sim.audit()
+    mem = sim.memory()
+    print(f"Opened {mem['live_channels']} channels in {dt:.3f}s "
+          f"({len(steps) * channels / dt:,.0f} frames/s); table {mem['table_bytes']:,} bytes "
+          f"({mem['bytes_per_channel']} B/channel) + index {mem['index_bytes']:,} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 # packet.py
+import struct
 from dataclasses import dataclass
 
-@dataclass
+_HEADER = struct.Struct("<HH")   # length, cid (little endian)
+HEADER_LEN = _HEADER.size
+MAX_FRAME = HEADER_LEN + 65535
+
+@dataclass(slots=True)
 class L2CAPFrame:
     length: int      # payload length (bytes)
     cid: int         # channel id
-    payload: bytes   # first byte = opcode
+    payload: bytes   # first byte = opcode (bytes, or a memoryview from parse_from)
 
 def serialize(frame: L2CAPFrame) -> bytes:
     if frame.length != len(frame.payload):
@@ -27,3 +32,45 @@ def parse(data: bytes) -> L2CAPFrame:
     if len(payload) != length:
         raise ValueError("declared length does not match payload bytes")
     return L2CAPFrame(length=length, cid=cid, payload=payload)
+
+# ---- Buffer codec: same checks as serialize/parse, into/from a caller's buffer ----
+# serialize_into is no faster than serialize (it still copies the payload);
+# parse_from skips parse's payload copy, a gap that grows with frame size
+# (bench.py codec.*.64K)
+
+def serialize_into(frame: L2CAPFrame, buf: bytearray, offset: int = 0) -> int:
+    """Write frame into buf at offset; returns the offset just past it.
+    A bytearray that is too short (and has no live views) is grown."""
+    length = frame.length
+    if length != len(frame.payload):
+        raise ValueError("length field must equal len(payload)")
+    if length < 0 or length > 65535:
+        raise ValueError("invalid length")
+    if not 0 <= frame.cid <= 0xFFFF:
+        raise OverflowError("cid does not fit in 2 bytes")
+    end = offset + HEADER_LEN + length
+    if len(buf) < end:
+        buf.extend(bytes(end - len(buf)))
+    _HEADER.pack_into(buf, offset, length, frame.cid)
+    buf[offset + HEADER_LEN:end] = frame.payload
+    return end
+
+def parse_from(buffer, offset: int = 0):
+    """Parse one frame at offset; returns (frame, next_offset). The payload is a
+    memoryview into buffer, so it is only valid while buffer is unchanged:
+    copy it (bytes(frame.payload)) before keeping the frame."""
+    if len(buffer) - offset < HEADER_LEN:
+        raise ValueError("frame too short for header")
+    length, cid = _HEADER.unpack_from(buffer, offset)
+    start = offset + HEADER_LEN
+    end = start + length
+    if end > len(buffer):
+        raise ValueError("declared length does not match payload bytes")
+    return L2CAPFrame(length, cid, memoryview(buffer)[start:end]), end
+
+def parse_many(buffer, offset: int = 0):
+    """Yield frames from a buffer of back-to-back frames without copying payloads."""
+    n = len(buffer)
+    while offset < n:
+        frame, offset = parse_from(buffer, offset)
+        yield frame
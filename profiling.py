@@ -0,0 +1,55 @@
+# profiling.py
+# Opt-in per-stage timers for StatefulFuzzer.run_trial (run_fuzz.py --profile).
+from time import perf_counter
+
+class StageProfiler:
+    """Cumulative seconds and call counts per named stage.
+
+    Only every `every`-th trial is timed; run_trial calls lap(stage, t) after
+    each stage, which books the time since t and returns the new timestamp."""
+
+    def __init__(self, every: int = 1):
+        self.every = max(1, every)
+        self.sampled_trials = 0
+        self.seconds = {}
+        self.calls = {}
+
+    def start(self) -> float:
+        self.sampled_trials += 1
+        return perf_counter()
+
+    def lap(self, stage: str, t0: float) -> float:
+        now = perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + (now - t0)
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        return now
+
+    def summary(self) -> dict:
+        return stage_summary(self.every, self.sampled_trials, self.seconds, self.calls)
+
+def stage_summary(every, sampled_trials, seconds, calls) -> dict:
+    total = sum(seconds.values())
+    return {
+        "sample_every": every,
+        "sampled_trials": sampled_trials,
+        "stages": {
+            k: {
+                "calls": calls[k],
+                "seconds": seconds[k],
+                "us_per_call": 1e6 * seconds[k] / calls[k] if calls[k] else 0.0,
+                "share": seconds[k] / total if total else 0.0,
+            }
+            for k in sorted(seconds, key=seconds.get, reverse=True)
+        },
+    }
+
+def merge_profiles(profiles) -> dict:
+    """Combine StageProfiler.summary() dicts from several shards."""
+    seconds, calls, sampled, every = {}, {}, 0, 1
+    for p in profiles:
+        every = p.get("sample_every", every)
+        sampled += p.get("sampled_trials", 0)
+        for k, st in p.get("stages", {}).items():
+            seconds[k] = seconds.get(k, 0.0) + st["seconds"]
+            calls[k] = calls.get(k, 0) + st["calls"]
+    return stage_summary(every, sampled, seconds, calls)
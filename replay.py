@@ -0,0 +1,235 @@
+# replay.py
+# Replay anomalies against VulnerableSimulator and report simulated impact.
+# Cases are streamed from the JSONL file, each one starts from a pre-staged
+# simulator snapshot for its state, and large corpora can be split across a
+# process pool.
+#
+#   python replay.py --mode verbose            # per-case lines + impact report
+#   python replay.py --mode summary            # impact totals only
+#   python replay.py --mode json --jobs 8      # machine-readable totals
+#   python replay.py --file results/anomalies.db --state CONFIGURING --opcode 0x03
+#   python replay.py --mode summary --verdict-cache 4096   # memoize repeated payloads
+import argparse, json, sys, time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from packet import L2CAPFrame, serialize_into, parse_from, MAX_FRAME
+from vuln_sim import VulnerableSimulator, FatalFault
+from l2cap_sim import State, Anomaly
+from spec import ACCEPTING_STATE, staged
+from events import EventBus
+from verdict_cache import process_cache
+import store
+
+OUTCOMES = ("ok", "dos", "leak", "bypass", "anomaly", "rejected")
+
+def stage_for(payload: bytes, recorded: str = None, stage: str = "opcode") -> State:
+    """State to inject payload in: the recorded state_at_input, or (default, and
+    for cases without one) the state that expects this opcode."""
+    if stage == "recorded" and recorded in State.__members__:
+        return State[recorded]
+    return ACCEPTING_STATE.get(payload[0] if payload else 0, State.DISCONNECTED)
+
+class Replayer:
+    """Reusable simulator + wire buffer; restores a staged snapshot per case.
+    Impact comes from the simulator's events.Finding, on a private bus.
+    verdict_cache > 0 routes handle() through the process's VerdictCache."""
+    def __init__(self, sim_cls=VulnerableSimulator, verdict_cache: int = 0):
+        self.sim = sim_cls()
+        self.cache = process_cache(verdict_cache) if verdict_cache else None
+        self.snaps = staged(sim_cls)
+        self._wire = memoryview(bytearray(MAX_FRAME))
+        self._found = []
+        self.sim.bus = EventBus(self._found.append)
+
+    def run(self, payload: bytes, target: State):
+        """Returns (outcome, detail) with outcome one of OUTCOMES."""
+        sim, found = self.sim, self._found
+        sim.restore(self.snaps[target])
+        found.clear()
+        try:
+            frame = L2CAPFrame(length=len(payload), cid=sim.cid, payload=payload)
+            parsed, _ = parse_from(self._wire[:serialize_into(frame, self._wire)])
+            if self.cache is None:
+                sim.handle(parsed)
+            else:
+                self.cache.handle(sim, parsed)
+        except FatalFault as e:
+            return "dos", str(e)
+        except Anomaly as e:
+            return "anomaly", str(e)
+        except Exception as e:
+            return "rejected", str(e)
+        if found:
+            return found[-1].kind, found[-1].leaked.hex()
+        return "ok", ""
+
+def iter_lines(path: str, chunk: int = 0):
+    """Stream non-empty lines; with chunk > 0 yield lists of up to chunk lines."""
+    batch = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if not chunk:
+                yield line
+                continue
+            batch.append(line)
+            if len(batch) >= chunk:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def decode(line: str):
+    """(reason, payload, state_at_input) or None for rows without a payload."""
+    obj = json.loads(line)
+    phex = obj.get("minimized_payload_hex") or obj.get("original_payload_hex")
+    if not phex:
+        return None
+    return obj.get("reason", ""), bytes.fromhex(phex), obj.get("state_at_input")
+
+def iter_store(path: str, chunk: int = 0, **filters):
+    """(reason, payload, state_at_input) cases from a store.py database, using
+    its indexes for filters; with chunk > 0 yield lists of up to chunk cases."""
+    batch = []
+    for _, rec in store.query(path, **filters):
+        phex = rec.get("minimized_payload_hex") or rec.get("original_payload_hex")
+        if not phex:
+            continue
+        case = (rec.get("reason", ""), bytes.fromhex(phex), rec.get("state_at_input"))
+        if not chunk:
+            yield case
+            continue
+        batch.append(case)
+        if len(batch) >= chunk:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def replay_lines(lines, stage: str = "opcode", keep: bool = False, verdict_cache: int = 0):
+    """Replay an iterable of JSONL lines; returns (Counter, case rows if keep)."""
+    return replay_cases(filter(None, map(decode, lines)), stage, keep, verdict_cache)
+
+def replay_cases(cases, stage: str = "opcode", keep: bool = False, verdict_cache: int = 0):
+    """Replay decoded (reason, payload, state_at_input) cases. With a verdict
+    cache the Counter also gets cache_hits / cache_misses."""
+    rp = Replayer(verdict_cache=verdict_cache)
+    hits0, misses0 = (rp.cache.hits, rp.cache.misses) if rp.cache else (0, 0)
+    totals = Counter()
+    rows = [] if keep else None
+    for reason, payload, recorded in cases:
+        outcome, detail = rp.run(payload, stage_for(payload, recorded, stage))
+        totals[outcome] += 1
+        totals["cases"] += 1
+        if keep:
+            rows.append((reason, payload[0] if payload else 0, len(payload), outcome, detail))
+    if rp.cache is not None:
+        totals["cache_hits"] += rp.cache.hits - hits0
+        totals["cache_misses"] += rp.cache.misses - misses0
+    return totals, rows
+
+def _replay_chunk(args):
+    return replay_lines(*args)
+
+def _replay_case_chunk(args):
+    return replay_cases(*args)
+
+def _bounded_map(pool, fn, work, window: int):
+    """pool.map with at most window tasks in flight: work is only read as
+    fast as results are taken, so a corpus is never loaded whole. Results
+    come back in submission order."""
+    pending = deque()
+    for args in work:
+        pending.append(pool.submit(fn, args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def replay_file(path: str, stage: str = "opcode", jobs: int = 1, keep: bool = False,
+                chunk: int = 20000, verdict_cache: int = 0, **filters):
+    """Yield (Counter, rows) per chunk, in file order. A .db path is read via
+    store.py and accepts its query filters (state, opcode, reason, ...)."""
+    is_db = path.endswith(".db")
+    if filters and not is_db:
+        raise ValueError("query filters need a store.py .db file")
+    if jobs <= 1:
+        if is_db:
+            yield replay_cases(iter_store(path, **filters), stage, keep, verdict_cache)
+        else:
+            yield replay_lines(iter_lines(path), stage, keep, verdict_cache)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        if is_db:
+            work = ((cases, stage, keep, verdict_cache) for cases in iter_store(path, chunk, **filters))
+            yield from _bounded_map(pool, _replay_case_chunk, work, 2 * jobs)
+        else:
+            work = ((lines, stage, keep, verdict_cache) for lines in iter_lines(path, chunk))
+            yield from _bounded_map(pool, _replay_chunk, work, 2 * jobs)
+
+def print_case(idx: int, row):
+    reason, opcode, length, outcome, detail = row
+    print(f"Case {idx}: {reason} | Opcode: 0x{opcode:02x} | Length: {length}")
+    if outcome == "dos":
+        print("→ [🔥 Simulated DoS] Device service crashed and restarted.\n")
+    elif outcome == "leak":
+        print(f"→ [⚠️  Simulated Info Leak] Device leaked bytes: {detail}\n")
+    elif outcome == "bypass":
+        print("→ [⚠️  Simulated Auth Bypass] Connection jumped directly to OPEN (unauthorized).\n")
+    elif outcome == "anomaly":
+        print(f"→ [!] Protocol anomaly: {detail}\n")
+    elif outcome == "rejected":
+        print(f"→ [x] Parser/runtime rejection: {detail}\n")
+
+def main(default_mode: str = "verbose"):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default="results/anomalies.jsonl",
+                    help="anomalies.jsonl, or an anomalies.db from run_fuzz.py --store sqlite")
+    ap.add_argument("--mode", choices=("verbose", "summary", "json"), default=default_mode)
+    ap.add_argument("--stage", choices=("opcode", "recorded"), default="opcode",
+                    help="inject in the state expecting the opcode, or in the recorded state_at_input")
+    ap.add_argument("--jobs", type=int, default=1, help="replay in a process pool of this size")
+    ap.add_argument("--chunk", type=int, default=20000, help="cases per pool task")
+    ap.add_argument("--verdict-cache", type=int, default=0, metavar="N",
+                    help="memoize handle() outcomes in an N-entry LRU cache per process")
+    ap.add_argument("--state", dest="state_filter", help=".db only: replay rows recorded in this state")
+    ap.add_argument("--opcode", type=lambda s: int(s, 0), help=".db only: replay rows with this opcode")
+    ap.add_argument("--reason", help=".db only: replay rows whose reason starts with this")
+    args = ap.parse_args()
+    filters = {k: v for k, v in (("state", args.state_filter), ("opcode", args.opcode),
+                                 ("reason", args.reason)) if v is not None}
+
+    t0 = time.time()
+    totals = Counter()
+    verbose = args.mode == "verbose"
+    if verbose:
+        print("\n--- Replaying anomalies for demonstration ---\n")
+    idx = 0
+    for counts, rows in replay_file(args.file, args.stage, args.jobs, verbose,
+                                   args.chunk, args.verdict_cache, **filters):
+        totals.update(counts)
+        for row in rows or ():
+            idx += 1
+            print_case(idx, row)
+    dt = time.time() - t0
+
+    if args.mode == "json":
+        keys = ("cases",) + OUTCOMES + (("cache_hits", "cache_misses") if args.verdict_cache else ())
+        json.dump({**{k: totals.get(k, 0) for k in keys}, "seconds": dt}, sys.stdout, indent=2)
+        print()
+        return
+    print("\n=== Simulated impact report ===")
+    print(f"Cases replayed:             {totals['cases']}")
+    print(f"DoS (crash/restart) events: {totals['dos']}")
+    print(f"InfoLeak responses:         {totals['leak']}")
+    print(f"AuthBypass events:          {totals['bypass']}   (demo rule triggers if CP status == 0x13 0x37)")
+    if verbose:
+        print(f"Protocol anomalies:         {totals['anomaly']}")
+        print(f"Parser/runtime rejections:  {totals['rejected']}")
+    if args.verdict_cache:
+        print(f"Verdict cache hits/misses:  {totals['cache_hits']}/{totals['cache_misses']}")
+    print(f"({dt:.2f}s) NOTE: Pure simulation for educational purposes only.\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,268 @@
-import argparse, json, os, time
-from fuzzer import StatefulFuzzer
+import argparse, json, os, pickle, time
+from concurrent.futures import ProcessPoolExecutor
+from fuzzer import StatefulFuzzer, derive_seeds, merge_summaries
+from sequence import SequenceFuzzer
+from mux_sim import MuxFuzzer
+from differential import PAIRS
+from l2cap_sim import L2CAPSimulator
+from vuln_sim import VulnerableSimulator
+from fast_sim import CompiledSimulator, CompiledVulnerableSimulator
+from sinks import JsonlSink, concat_files
+from store import SqliteSink, merge_files
+from dedup import DedupIndex, SketchDedupIndex
+from profiling import StageProfiler
+
+ENGINES = {"reference": L2CAPSimulator, "compiled": CompiledSimulator,
+           "vuln": VulnerableSimulator, "compiled-vuln": CompiledVulnerableSimulator}
+ANOMALIES = "results/anomalies.jsonl"
+TIMELINE = "results/timeline.jsonl"
+CORPUS = "results/corpus.jsonl"
+ANOMALIES_DB = "results/anomalies.db"
+CHECKPOINT = "results/checkpoint.pkl"
+# Timeline trial numbering per shard when the trial count is open-ended
+UNBOUNDED_STRIDE = 10 ** 12
+
+def shard_path(path: str, shard):
+    return path if shard is None else f"{path}.{shard}"
+
+def make_dedup(opts: dict):
+    if not opts["dedup"]:
+        return None
+    if opts["dedup_sketch"]:
+        return SketchDedupIndex(max_per_sig=opts["dedup"])
+    return DedupIndex(max_per_sig=opts["dedup"])
+
+def make_fuzzer(seed: int, opts: dict, anomalies, timeline, trial_offset: int = 0):
+    kw = dict(seed=seed, minimize_jobs=opts["minimize_jobs"], minimize_batch=opts["minimize_batch"],
+              sim_cls=(PAIRS if opts["differential"] else ENGINES)[opts["engine"]], anomaly_sink=anomalies,
+              timeline_sink=timeline, timeline_every=opts["timeline_every"],
+              trial_offset=trial_offset, corpus=opts["corpus"], dedup=make_dedup(opts),
+              profiler=StageProfiler(opts["profile_every"]) if opts["profile"] else None,
+              schedule=opts["schedule"], verdict_cache=opts["verdict_cache"])
+    if opts["sequence_depth"]:
+        # --trials counts sessions; timeline trial numbers count frames
+        kw["trial_offset"] = trial_offset * opts["sequence_depth"]
+        return SequenceFuzzer(depth=opts["sequence_depth"], **kw)
+    if opts["channels"]:
+        kw.pop("sim_cls")
+        return MuxFuzzer(channels=opts["channels"], **kw)
+    return StatefulFuzzer(**kw)
+
+def save_checkpoint(path: str, fz, **progress):
+    """Pickle a drained fuzzer plus run progress; replaced atomically."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"fuzzer": fz, **progress}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def load_checkpoint(path: str) -> dict:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def run_shard(seed: int, trials, opts: dict, shard=None, trial_offset: int = 0):
+    """Run one independent fuzzer, streaming its results; module-level so the
+    process pool can pickle it. Returns the shard's summary().
+
+    trials=None runs until --duration or --stop-on-plateau. With
+    --checkpoint-every the drained fuzzer is pickled every N trials, together
+    with the sink offsets reached; --resume truncates the output back to those
+    offsets and continues, so the files match an uninterrupted run."""
+    batch = opts["batch_size"]
+    sink_cls, anom_path = (SqliteSink, ANOMALIES_DB) if opts["store"] == "sqlite" else (JsonlSink, ANOMALIES)
+    anom_path, tl_path = shard_path(anom_path, shard), shard_path(TIMELINE, shard)
+    ckpt_path = shard_path(CHECKPOINT, shard)
+    if opts["resume"] and os.path.exists(ckpt_path):
+        ck = load_checkpoint(ckpt_path)
+        fz = ck["fuzzer"]
+        anomalies = sink_cls.reopen(anom_path, ck["anomalies_offset"], batch)
+        timeline = JsonlSink.reopen(tl_path, ck["timeline_offset"], batch)
+        fz.anomaly_sink, fz.timeline = anomalies, timeline
+        done, cpu, elapsed = ck["done"], ck["cpu_seconds"], ck["seconds"]
+        best, last_new = ck["progress"], ck["last_progress"]
+    else:
+        anomalies, timeline = sink_cls(anom_path, batch), JsonlSink(tl_path, batch)
+        fz = make_fuzzer(seed, opts, anomalies, timeline, trial_offset)
+        done = last_new = 0
+        cpu = elapsed = 0.0
+        best = fz.progress()
+
+    duration, plateau, every = opts["duration"], opts["stop_on_plateau"], opts["checkpoint_every"]
+    # Budgets are checked between chunks of trials
+    chunk = min(n for n in (256, plateau, every) if n)
+    next_ckpt = (done // every + 1) * every if every else None
+    t0, cpu0 = time.time(), time.process_time()
+    stopped = None
+    with anomalies, timeline:
+        try:
+            while stopped is None:
+                if trials is not None and done >= trials:
+                    stopped = "trials"
+                elif duration and elapsed + time.time() - t0 >= duration:
+                    stopped = "duration"
+                elif plateau and done - last_new >= plateau:
+                    stopped = "plateau"
+                else:
+                    n = chunk if trials is None else min(chunk, trials - done)
+                    for _ in range(n):
+                        fz.run_trial()
+                    done += n
+                    p = fz.progress()
+                    if p > best:
+                        best, last_new = p, done
+                    if every and done >= next_ckpt:
+                        fz.drain()
+                        save_checkpoint(ckpt_path, fz, done=done, progress=best, last_progress=last_new,
+                                        cpu_seconds=cpu + time.process_time() - cpu0,
+                                        seconds=elapsed + time.time() - t0,
+                                        anomalies_offset=anomalies.offset(),
+                                        timeline_offset=timeline.offset())
+                        next_ckpt += every
+        except KeyboardInterrupt:
+            # The trial in flight may be half-applied: keep the last periodic
+            # checkpoint, --resume redoes everything after it
+            stopped = "interrupted"
+        fz.drain()
+        cpu += time.process_time() - cpu0
+        elapsed += time.time() - t0
+        if every and stopped != "interrupted":
+            # Final checkpoint: --resume with a larger budget extends the run
+            save_checkpoint(ckpt_path, fz, done=done, progress=best, last_progress=last_new,
+                            cpu_seconds=cpu, seconds=elapsed,
+                            anomalies_offset=anomalies.offset(), timeline_offset=timeline.offset())
+    if opts["corpus"]:
+        with JsonlSink(shard_path(CORPUS, shard), batch) as out:
+            for row in fz.corpus_entries():
+                out.write(row)
+    return {**fz.summary(), "cpu_seconds": cpu, "shard_seconds": elapsed, "stopped": stopped}
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--trials", type=int, default=2000)
+    ap.add_argument("--trials", type=int, default=None,
+                    help="trial budget (default 2000, or open-ended with --duration/--stop-on-plateau)")
     ap.add_argument("--seed", type=int, default=1337)
+    ap.add_argument("--workers", type=int, default=1,
+                    help="number of fuzzer processes; trials are split across them")
+    ap.add_argument("--minimize-jobs", type=int, default=0,
+                    help="minimize anomalies in a background pool of this size (0 = inline)")
+    ap.add_argument("--minimize-batch", type=int, default=64, metavar="N",
+                    help="with --minimize-jobs, anomalies per pool task (see fuzzer.minimize_many)")
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="reference",
+                    help="simulator implementation (compiled = table-driven fast_sim; "
+                         "vuln = with VulnerableSimulator's deliberate flaws)")
+    ap.add_argument("--batch-size", type=int, default=256,
+                    help="rows buffered per results file before each write")
+    ap.add_argument("--timeline-every", type=int, default=10,
+                    help="log every Nth accepted trial to timeline.jsonl "
+                         "(anomalies and new transitions are always logged)")
+    ap.add_argument("--corpus", action="store_true",
+                    help="coverage-guided mode: keep and reschedule inputs that add coverage")
+    ap.add_argument("--dedup", type=int, default=0, metavar="N",
+                    help="minimize and store only the first N anomalies per signature (0 = off)")
+    ap.add_argument("--dedup-sketch", action="store_true",
+                    help="fixed-memory count-min sketch for the --dedup index")
+    ap.add_argument("--profile", action="store_true",
+                    help="record per-stage run_trial timings into summary.json")
+    ap.add_argument("--profile-every", type=int, default=1,
+                    help="with --profile, time only every Nth trial")
+    ap.add_argument("--sequence-depth", type=int, default=0, metavar="D",
+                    help="session mode: each trial is a session of up to D frames, "
+                         "with executed prefixes cached in a snapshot trie")
+    ap.add_argument("--schedule", action="store_true",
+                    help="adaptive mutation-operator scheduler (operator yields go to summary.json)")
+    ap.add_argument("--store", choices=("jsonl", "sqlite"), default="jsonl",
+                    help="anomaly output: anomalies.jsonl, or an indexed anomalies.db (see store.py)")
+    ap.add_argument("--duration", type=float, default=0, metavar="SECONDS",
+                    help="stop after this much wall time (counted across --resume)")
+    ap.add_argument("--stop-on-plateau", type=int, default=0, metavar="K",
+                    help="stop once K trials pass without a new transition or anomaly signature")
+    ap.add_argument("--checkpoint-every", type=int, default=0, metavar="N",
+                    help="pickle the fuzzer state to results/checkpoint.pkl every N trials")
+    ap.add_argument("--resume", action="store_true",
+                    help="continue from results/checkpoint.pkl (output after it is discarded)")
+    ap.add_argument("--channels", type=int, default=0, metavar="N",
+                    help="multi-channel mode: interleave trials over N CIDs in one MuxSimulator")
+    ap.add_argument("--differential", action="store_true",
+                    help="run every frame on the engine and its VulnerableSimulator variant in "
+                         "lockstep; divergences are recorded as anomalies (see differential.py)")
+    ap.add_argument("--verdict-cache", type=int, default=0, metavar="N",
+                    help="memoize handle() outcomes in an N-entry LRU cache, shared with "
+                         "in-process minimization (see verdict_cache.py)")
     args = ap.parse_args()
+    if args.differential and (args.engine not in PAIRS or args.channels):
+        ap.error(f"--differential needs --engine {' or '.join(PAIRS)} and no --channels")
+    if args.verdict_cache and (args.engine not in ("reference", "vuln") or args.channels
+                               or args.differential):
+        ap.error("--verdict-cache needs --engine reference or vuln, without --channels or --differential")
+    if args.sequence_depth and (args.corpus or args.profile):
+        # SequenceFuzzer.run_trial neither keeps corpus seeds nor times stages
+        ap.error("--sequence-depth cannot be combined with --corpus or --profile")
+    if args.channels and (args.corpus or args.sequence_depth):
+        ap.error("--channels cannot be combined with --corpus or --sequence-depth")
+    if args.channels and args.engine != "reference":
+        # MuxSimulator is its own engine (fast_sim's dispatch table over a channel table)
+        ap.error("--channels runs MuxSimulator; --engine cannot be changed with it")
+    if args.trials is None and not (args.duration or args.stop_on_plateau):
+        args.trials = 2000
+    opts = {"minimize_jobs": args.minimize_jobs, "minimize_batch": args.minimize_batch,
+            "engine": args.engine,
+            "batch_size": args.batch_size, "timeline_every": args.timeline_every,
+            "corpus": args.corpus, "dedup": args.dedup, "dedup_sketch": args.dedup_sketch,
+            "profile": args.profile, "profile_every": args.profile_every,
+            "sequence_depth": args.sequence_depth, "store": args.store,
+            "schedule": args.schedule, "duration": args.duration,
+            "stop_on_plateau": args.stop_on_plateau, "checkpoint_every": args.checkpoint_every,
+            "resume": args.resume, "channels": args.channels,
+            "differential": args.differential, "verdict_cache": args.verdict_cache}
 
-    fz = StatefulFuzzer(seed=args.seed)
+    workers = max(1, args.workers)
+    os.makedirs("results", exist_ok=True)
     t0 = time.time()
-    for _ in range(args.trials):
-        fz.run_trial()
-    dt = time.time() - t0
+    if workers == 1:
+        # Single shard keeps the exact --seed so old runs stay reproducible
+        results = [run_shard(args.seed, args.trials, opts)]
+        summary = dict(results[0])
+    else:
+        seeds = derive_seeds(args.seed, workers)
+        if args.trials is None:
+            counts = [None] * workers
+            offsets = [i * UNBOUNDED_STRIDE for i in range(workers)]
+        else:
+            counts = [args.trials // workers + (1 if i < args.trials % workers else 0)
+                      for i in range(workers)]
+            offsets = [sum(counts[:i]) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_shard, seeds[i], counts[i], opts, i, offsets[i])
+                       for i in range(workers)]
+            try:
+                results = [f.result() for f in futures]
+            except KeyboardInterrupt:
+                # Shards catch Ctrl-C themselves and return what they have
+                results = [f.result() for f in futures]
+            summary = merge_summaries(results)
+        # Checkpointed shards keep their own files so each can be resumed
+        keep = bool(args.checkpoint_every)
+        jsonl = (TIMELINE,) + ((CORPUS,) if args.corpus else ())
+        if args.store == "sqlite":
+            merge_files([shard_path(ANOMALIES_DB, i) for i in range(workers)], ANOMALIES_DB,
+                        remove=not keep)
+        else:
+            jsonl = (ANOMALIES,) + jsonl
+        for path in jsonl:
+            concat_files([shard_path(path, i) for i in range(workers)], path, remove=not keep)
+    summary.pop("shard_seconds", None)
+    summary["stopped"] = sorted({r["stopped"] for r in results})
+    # A resumed run counts the wall time of the runs before it too
+    dt = max([time.time() - t0] + [r["shard_seconds"] for r in results])
+    if summary["cpu_seconds"] > 0:
+        summary["unique_findings_per_cpu_sec"] = summary["unique_findings"] / summary["cpu_seconds"]
 
-    os.makedirs("results", exist_ok=True)
     with open("results/summary.json", "w") as f:
-        json.dump({**fz.summary(), "seconds": dt}, f, indent=2)
-    with open("results/anomalies.jsonl", "w") as f:
-        for a in fz.anomalies:
-            f.write(json.dumps(a) + "\n")
+        json.dump({**summary, "workers": workers, "seconds": dt}, f, indent=2)
 
     print("\n=== FUZZ SUMMARY ===")
-    print(json.dumps({**fz.summary(), "seconds": dt}, indent=2))
-    print("\nAnomalies saved to results/anomalies.jsonl (if any).\n")
+    print(json.dumps({**summary, "workers": workers, "seconds": dt}, indent=2))
+    print(f"\nAnomalies saved to {ANOMALIES_DB if args.store == 'sqlite' else ANOMALIES}, "
+          f"timeline to {TIMELINE}.\n")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,154 @@
+# sequence.py
+# Session-sequence fuzzing: each trial is a whole session of frames from
+# DISCONNECTED. Executed prefixes live in a trie with a simulator snapshot per
+# node, so a session that shares a prefix with an earlier one only executes its
+# new suffix instead of replaying everything from DISCONNECTED.
+from typing import Dict, Any
+from packet import L2CAPFrame, serialize_into, parse_from
+from l2cap_sim import State, Anomaly, STATE_INDEX, N_STATES
+from spec import staged
+from mutation import mutate_length_consistent
+from fuzzer import StatefulFuzzer, build_valid_frame
+from dedup import reason_template
+from events import FINDING_REASONS
+
+class TrieNode:
+    __slots__ = ("children", "snapshot", "state", "hits")
+
+    def __init__(self, snapshot, state: State, hits=(None, None, None)):
+        # (length, payload) -> TrieNode, or (reason, hits) on anomaly
+        self.children = {}
+        self.snapshot = snapshot
+        self.state = state
+        # (opcode_hits index, edge_hits index, events.Finding kind) the frame into
+        # this node bumped or emitted, each None if it did not
+        self.hits = hits
+
+def _bumped(sim, row: int, op_idx, op0: int, edges0) -> tuple:
+    """(opcode_hits index, edge_hits index) handle() incremented, from before/after values."""
+    if op_idx is not None and sim.opcode_hits[op_idx] == op0:
+        op_idx = None
+    return op_idx, next((row + j for j, n in enumerate(edges0) if sim.edge_hits[row + j] != n), None)
+
+class SequenceFuzzer(StatefulFuzzer):
+    """StatefulFuzzer whose run_trial() runs one session of up to `depth` frames.
+
+    Sessions stop at the first anomaly. Stats count every frame as a trial;
+    handle_calls vs naive_handle_calls shows what the trie saved."""
+    def __init__(self, seed: int = 1337, depth: int = 8, mutate_prob: float = 0.3,
+                 max_nodes: int = 1 << 18, **kw):
+        super().__init__(seed=seed, **kw)
+        self.depth = depth
+        self.mutate_prob = mutate_prob
+        self.max_nodes = max_nodes
+        self.root = TrieNode(staged(self.sim_cls)[State.DISCONNECTED], State.DISCONNECTED)
+        self.nodes = 1
+        self.seq_stats = {"sessions": 0, "handle_calls": 0, "naive_handle_calls": 0}
+
+    def _next_frame(self, st: State) -> L2CAPFrame:
+        base = build_valid_frame(st, self.sim.cid, self.rng)
+        payload = base.payload
+        if self.rng.random() < self.mutate_prob:
+            payload = self._mutate(payload)
+        elif self.scheduler is not None:
+            self.scheduler.last = None           # unmutated frame: nothing to credit
+        rng = self.rng if self.scheduler is None else self.scheduler.pool
+        length = mutate_length_consistent(base.length, payload, rng)
+        return L2CAPFrame(length=length, cid=base.cid, payload=payload)
+
+    def run_trial(self):
+        """Run one session; returns True if it ran to full depth without anomaly."""
+        self.seq_stats["sessions"] += 1
+        node, live, prefix = self.root, None, ()
+        for _ in range(self.depth):
+            st = node.state
+            frame = self._next_frame(st)
+            key = (frame.length, bytes(frame.payload))
+            self.stats["trials"] += 1
+            self.seq_stats["naive_handle_calls"] += 1
+            child = node.children.get(key)
+            if isinstance(child, TrieNode):          # prefix already executed
+                self.stats["accepted"] += 1
+                self._replay_hits(child.hits)
+                node = child
+                prefix += (key,)
+                continue
+            if child is not None:                    # known anomaly: nothing new here
+                reason, hits = child
+                self.stats["anomalies" if reason.startswith("Anomaly") else "rejected"] += 1
+                self._replay_hits(hits)
+                return False
+
+            if live is not node:                     # resume from the cached state
+                self.sim.restore(node.snapshot)
+            reason = None
+            # Coverage counters this frame may bump, so trie hits can repeat them
+            i0 = STATE_INDEX[st]
+            row = i0 * N_STATES
+            op_idx = (i0 << 8) | frame.payload[0] if frame.payload else None
+            op0 = self.sim.opcode_hits[op_idx] if op_idx is not None else 0
+            edges0 = self.sim.edge_hits[row:row + N_STATES]
+            try:
+                end = serialize_into(frame, self._wire)
+                parsed, _ = parse_from(self._wire[:end])
+                self.stats["accepted"] += 1
+                self.seq_stats["handle_calls"] += 1
+                if self.verdicts is None:
+                    self.sim.handle(parsed)
+                else:
+                    self.verdicts.handle(self.sim, parsed)
+            except Anomaly as e:
+                self.stats["anomalies"] += 1
+                reason = f"Anomaly: {str(e)}"
+            except Exception as e:
+                self.stats["rejected"] += 1
+                reason = f"Parser/Runtime error: {str(e)}"
+
+            hits = (*_bumped(self.sim, row, op_idx, op0, edges0),
+                    self._event.kind if self._event is not None else None)
+            if reason is not None:
+                if self.timeline is not None:
+                    self._log_event("Anomaly" if reason.startswith("Anomaly") else "Rejected")
+                if self.nodes < self.max_nodes:
+                    node.children[key] = (reason, hits)
+                    self.nodes += 1
+                if self.scheduler is not None:
+                    self._credit_operator(st, frame, reason_template(reason))
+                self._record_anomaly(frame, reason, st, prefix)
+                return False
+
+            if self.timeline is not None:
+                self._log_event("Accepted", (st.name, self.sim.state.name))
+            if self.scheduler is not None:
+                self._credit_operator(st, frame, "->" + self.sim.state.name)
+            if self._event is not None:
+                self._record_anomaly(frame, FINDING_REASONS[self._event.kind], st, prefix)
+            child = TrieNode(self.sim.snapshot(), self.sim.state, hits)
+            if self.nodes < self.max_nodes:
+                node.children[key] = child
+                self.nodes += 1
+            node = live = child
+            prefix += (key,)
+        return True
+
+    def _replay_hits(self, hits):
+        # A cached frame counts toward transition/opcode coverage and finding
+        # counts (summary "impact") as if re-executed
+        op_idx, edge, kind = hits
+        if kind is not None:
+            self.events.counts[kind] += 1
+        if op_idx is not None:
+            self.sim.opcode_hits[op_idx] += 1
+        if edge is not None:
+            self.sim.edge_hits[edge] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        calls = self.seq_stats["handle_calls"]
+        naive = self.seq_stats["naive_handle_calls"]
+        return {
+            **super().summary(),
+            **self.seq_stats,
+            "session_depth": self.depth,
+            "trie_nodes": self.nodes,
+            "handle_call_reduction": naive / calls if calls else None,
+        }
@@ -0,0 +1,63 @@
+# sinks.py
+# Buffered, bounded-memory JSONL writers for results/anomalies.jsonl and
+# results/timeline.jsonl. Rows are encoded as they arrive and written in batches,
+# so memory stays at one batch however long the run is and a crash loses at most
+# one batch.
+import json, os, shutil
+
+class JsonlSink:
+    def __init__(self, path: str, batch_size: int = 256, mode: str = "w"):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._f = open(path, mode)
+        self._buf = []
+        self.rows = 0
+
+    def write(self, row: dict):
+        self._buf.append(json.dumps(row))
+        self.rows += 1
+        if len(self._buf) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._f.write("\n".join(self._buf) + "\n")
+            self._buf.clear()
+        self._f.flush()
+
+    def offset(self) -> int:
+        """Flush and return the file position (a run_fuzz.py checkpoint mark)."""
+        self.flush()
+        return self._f.tell()
+
+    @classmethod
+    def reopen(cls, path: str, offset: int, batch_size: int = 256):
+        """Drop anything written after offset and continue appending."""
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+        return cls(path, batch_size, mode="a")
+
+    def close(self):
+        if self._f is not None:
+            self.flush()
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def concat_files(parts, out_path: str, remove: bool = True):
+    """Concatenate shard files (e.g. from --workers) into out_path."""
+    with open(out_path, "wb") as out:
+        for p in parts:
+            if os.path.exists(p):
+                with open(p, "rb") as f:
+                    shutil.copyfileobj(f, out)
+                if remove:
+                    os.remove(p)
@@ -0,0 +1,263 @@
+# spec.py
+# Declarative layout of every signaling opcode: its fields (fixed or variable
+# size, length-of relations, the only accepted value), the states that accept
+# it and where it leads. At import the table is compiled into
+#   - CHECKS:     opcode -> check(sim, frame), the length/value validation (and
+#                 side effects) fast_sim's dispatch table runs
+#   - generate(): a valid payload for a state (build_valid_frame)
+#   - MUTATORS:   opcode -> field-aware mutator (mutation.mutate_payload_core)
+#   - field tables for the scheduler's operators (mutation.OPERATORS)
+#   - STAGING / staged(): the valid frames (and snapshots) that reach each state
+# so a new opcode costs one OpcodeSpec entry. L2CAPSimulator stays hand-written:
+# it is the oracle fast_sim.check_equivalence holds the compiled checks to.
+from dataclasses import dataclass
+from packet import L2CAPFrame
+from l2cap_sim import L2CAPSimulator, State, Anomaly, CR, CP, FR, FP, DT, DC
+
+@dataclass(frozen=True, slots=True)
+class Field:
+    name: str
+    size: int = None            # bytes; None = variable length
+    default: bytes = b""        # value in generated (valid) frames
+    valid: bytes = None         # the only value the target accepts
+    length_of: str = None       # 1-byte field holding len(<that field>), which must follow it
+    min_size: int = 0           # variable fields: fewer bytes is "too short"
+
+@dataclass(frozen=True, slots=True)
+class OpcodeSpec:
+    opcode: int
+    name: str                   # used in the anomaly messages ("<name> too short", ...)
+    fields: tuple
+    transitions: dict           # accepting state -> (next state, generation weight)
+    response: bytes             # reply payload
+    effect: str = None          # "configure" | "count_data"
+
+SPECS = (
+    OpcodeSpec(CR, "ConnectReq", (Field("psm", 1, b"\x01"), Field("flags", None, b"\x00")),
+               {State.DISCONNECTED: (State.CONNECTING, 1.0)}, bytes([CP, 0x00, 0x00])),
+    OpcodeSpec(CP, "ConnectRsp", (Field("status", 2, b"\x00\x00", valid=b"\x00\x00"),),
+               {State.CONNECTING: (State.CONFIGURING, 1.0)}, bytes([FR, 0x01, 0x00])),
+    OpcodeSpec(FR, "ConfigReq", (Field("type", 1, b"\x01"), Field("length", 1, length_of="option"),
+                                 Field("option", None, b"\xAA\xBB")),
+               {State.CONFIGURING: (State.OPEN, 0.5)}, bytes([FP, 0x00]), "configure"),
+    OpcodeSpec(FP, "ConfigRsp", (Field("result", 1, b"\x00"),),
+               {State.CONFIGURING: (State.OPEN, 0.5)}, bytes([FP, 0x00]), "configure"),
+    OpcodeSpec(DT, "Data", (Field("data", None, b"\x42\x42", min_size=1),),
+               {State.OPEN: (State.OPEN, 0.75)}, bytes([DT, 0x00]), "count_data"),
+    OpcodeSpec(DC, "Disconnect", (Field("reason", None, b"\x00"),),
+               {State.OPEN: (State.CLOSING, 0.25), State.CLOSING: (State.DISCONNECTED, 1.0)},
+               bytes([DC, 0x00])),
+)
+BY_OPCODE = {s.opcode: s for s in SPECS}
+
+def layout(spec: OpcodeSpec):
+    """(field, payload offset) pairs; offsets after a variable field are None."""
+    off, out = 1, []
+    for f in spec.fields:
+        out.append((f, off))
+        off = None if off is None or f.size is None else off + f.size
+    return out
+
+def default_payload(spec: OpcodeSpec) -> bytes:
+    defaults = {f.name: f.default for f in spec.fields}
+    return bytes([spec.opcode]) + b"".join(
+        bytes([len(defaults[f.length_of])]) if f.length_of else f.default for f in spec.fields)
+
+# -- validators --------------------------------------------------------------
+_EFFECTS = {"configure": "sim.config_ok = True",
+            "count_data": "sim.bytes_seen += n - 1"}
+
+def _check_source(spec: OpcodeSpec):
+    """Source of a specialized check(sim, frame), or None if nothing to check.
+    Order matches L2CAPSimulator: declared length, length-of, then values."""
+    fields = layout(spec)
+    body = []
+    if all(f.size is not None for f in spec.fields):
+        total = 1 + sum(f.size for f in spec.fields)
+        body.append(f"if n != {total}: raise Anomaly({spec.name + ' wrong length'!r})")
+    else:
+        least = 1 + sum(f.size if f.size is not None else f.min_size for f in spec.fields)
+        if least > 1:
+            body.append(f"if n < {least}: raise Anomaly({spec.name + ' too short'!r})")
+    for f, off in fields:
+        if f.length_of:
+            body.append(f"if {off + 1} + frame.payload[{off}] != n: "
+                        f"raise Anomaly({f'{spec.name} {f.length_of} length mismatch'!r})")
+    for f, off in fields:
+        if f.valid is not None:
+            body.append(f"if frame.payload[{off}:{off + f.size}] != {f.valid!r}: "
+                        f"raise Anomaly({spec.name + ' not OK'!r})")
+    if spec.effect:
+        body.append(_EFFECTS[spec.effect])
+    if not body:
+        return None
+    return "def check(sim, frame):\n    n = frame.length\n" + "".join(f"    {l}\n" for l in body)
+
+def _compile_check(spec: OpcodeSpec):
+    src = _check_source(spec)
+    if src is None:
+        return None
+    ns = {"Anomaly": Anomaly}
+    exec(compile(src, f"<spec {spec.name}>", "exec"), ns)
+    fn = ns["check"]
+    fn.__name__ = fn.__qualname__ = f"check_{spec.name}"
+    fn.source = src
+    return fn
+
+CHECKS = {s.opcode: _compile_check(s) for s in SPECS}
+# (state, opcode) -> next state
+TRANSITIONS = {(st, s.opcode): nxt for s in SPECS for st, (nxt, _) in s.transitions.items()}
+
+# opcode -> first state (in its transitions) that accepts it
+ACCEPTING_STATE = {s.opcode: next(iter(s.transitions)) for s in SPECS}
+
+# -- generators --------------------------------------------------------------
+def _generators():
+    # Per state: (cumulative weight, payload) with the rarer opcodes first;
+    # one rng.random() draw picks among several, none is drawn for one
+    per_state = {}
+    for s in SPECS:
+        for st, (_, w) in s.transitions.items():
+            per_state.setdefault(st, []).append((w, default_payload(s)))
+    table = {}
+    for st, alts in per_state.items():
+        alts.sort(key=lambda a: a[0])       # stable: ties keep SPECS order
+        acc, cum = 0.0, []
+        for w, pl in alts:
+            acc += w
+            cum.append((acc, pl))
+        table[st] = tuple(cum)
+    return table
+
+GENERATORS = _generators()
+
+def generate(state: State, rng) -> bytes:
+    """A valid payload for state (weighted pick among the opcodes it accepts)."""
+    alts = GENERATORS.get(state)
+    if alts is None:
+        return bytes([DC, 0x00])
+    if len(alts) == 1:
+        return alts[0][1]
+    r = rng.random() * alts[-1][0]
+    for acc, pl in alts:
+        if r < acc:
+            return pl
+    return alts[-1][1]
+
+# -- staging -----------------------------------------------------------------
+def _staging():
+    # Breadth-first from DISCONNECTED over the transitions, default payloads;
+    # ties go to the earlier spec (ConfigReq before ConfigRsp)
+    paths, frontier = {State.DISCONNECTED: ()}, [State.DISCONNECTED]
+    while frontier:
+        reached = []
+        for st in frontier:
+            for s in SPECS:
+                if st in s.transitions:
+                    nxt = s.transitions[st][0]
+                    if nxt not in paths:
+                        paths[nxt] = paths[st] + (default_payload(s),)
+                        reached.append(nxt)
+        frontier = reached
+    return paths
+
+# State -> shortest chain of valid payloads that walks a fresh simulator there
+STAGING = _staging()
+_staged = {}
+
+def staged(sim_cls=L2CAPSimulator):
+    """Snapshot per State for sim_cls, driven once and cached; restore() from it
+    instead of replaying the staging frames for every case."""
+    snaps = _staged.get(sim_cls)
+    if snaps is None:
+        snaps = {}
+        for state, payloads in STAGING.items():
+            sim = sim_cls()
+            for pl in payloads:
+                sim.handle(L2CAPFrame(length=len(pl), cid=sim.cid, payload=pl))
+            snaps[state] = sim.snapshot()
+        _staged[sim_cls] = snaps
+    return snaps
+
+# -- field tables (offsets into the core, i.e. the payload after the opcode) --
+def _tables():
+    value, length, short = {}, {}, {}
+    for s in SPECS:
+        for f, off in layout(s):
+            if off is None:
+                continue
+            if f.valid is not None and s.opcode not in value:
+                value[s.opcode] = (off - 1, f.size)
+            if f.length_of and s.opcode not in length:
+                length[s.opcode] = off - 1
+            if f.size is None and f.min_size and s.opcode not in short:
+                short[s.opcode] = off - 1
+    return value, length, short
+
+# opcode -> (core offset, size) of a field with a single valid value
+# opcode -> core offset of a length-of field (its target starts right after)
+# opcode -> core offset of a variable field that has a minimum size
+VALUE_FIELDS, LENGTH_FIELDS, SHORTABLE_FIELDS = _tables()
+
+# -- field-aware mutators ----------------------------------------------------
+def flip_any(op, core, rng):
+    """Fallback: flip the low bit of one core byte."""
+    if len(core) > 0:
+        core[rng.randrange(len(core))] ^= 0x01
+    return bytes([op]) + bytes(core)
+
+def _value_mutator(off, size):
+    def mutate(op, core, rng):
+        # Keep the valid value most runs so the session progresses
+        if rng.random() < 0.70:
+            return bytes([op]) + bytes(core)
+        i = off + int(rng.random() * min(size, len(core) - off))   # bump one byte of it
+        core[i] = (core[i] + 1) % 256
+        return bytes([op]) + bytes(core)
+    return mutate
+
+def _length_mutator(off):
+    def mutate(op, core, rng):
+        if len(core) < off + 1:
+            return flip_any(op, core, rng)
+        n = core[off]
+        val = bytearray(core[off+1:off+1+n])
+        if len(val) > 0:
+            val[rng.randrange(len(val))] ^= 0x01  # minimal, structured mutation
+        keep_len = rng.random() < 0.70          # 30%: provoke a length mismatch
+        new_len = len(val) if keep_len else (len(val) ^ 1) & 0xFF
+        return bytes([op]) + bytes(core[:off]) + bytes([new_len]) + bytes(val)
+    return mutate
+
+def _short_mutator(off):
+    def mutate(op, core, rng):
+        # ~20%: cut the field below its minimum ("too short" path)
+        if len(core) > off and rng.random() < 0.20:
+            core = core[:off]
+        return flip_any(op, core, rng)
+    return mutate
+
+def _mutators():
+    out = {}
+    for s in SPECS:
+        op = s.opcode
+        if op in VALUE_FIELDS:
+            out[op] = _value_mutator(*VALUE_FIELDS[op])
+        elif op in LENGTH_FIELDS:
+            out[op] = _length_mutator(LENGTH_FIELDS[op])
+        elif op in SHORTABLE_FIELDS:
+            out[op] = _short_mutator(SHORTABLE_FIELDS[op])
+    return out
+
+MUTATORS = _mutators()
+
+def main():
+    for state, payloads in STAGING.items():
+        print(f"{state.name:>12}: staged by {' '.join(pl.hex() for pl in payloads) or '(nothing)'}")
+    for s in SPECS:
+        print(f"0x{s.opcode:02x} {s.name}: valid {default_payload(s).hex()}")
+        src = _check_source(s)
+        print("    " + (src.replace("\n", "\n    ").rstrip() if src else "(no checks)"))
+
+if __name__ == "__main__":
+    main()
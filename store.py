@@ -0,0 +1,238 @@
+# store.py
+# SQLite anomaly store, an alternative to results/anomalies.jsonl.
+# Payloads are kept as raw BLOBs (half the size of hex) and state_at_input,
+# reason, opcode and length are indexed columns, so filtered queries do not
+# scan the whole corpus.
+#
+#   python run_fuzz.py --store sqlite                      # writes results/anomalies.db
+#   python store.py query --state CONFIGURING --opcode 0x03
+#   python store.py export results/anomalies.db results/anomalies.jsonl
+#   python store.py import results/anomalies.jsonl results/anomalies.db
+import argparse, json, os, sqlite3, sys
+from urllib.request import pathname2url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomalies (
+    id INTEGER PRIMARY KEY,
+    reason TEXT,
+    state_at_input TEXT,
+    opcode INTEGER,
+    length INTEGER,
+    cid INTEGER,
+    payload BLOB,
+    minimized BLOB,
+    minimize_execs INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_state_opcode ON anomalies (state_at_input, opcode);
+CREATE INDEX IF NOT EXISTS ix_reason ON anomalies (reason);
+CREATE INDEX IF NOT EXISTS ix_opcode ON anomalies (opcode);
+CREATE INDEX IF NOT EXISTS ix_length ON anomalies (length);
+"""
+COLUMNS = ("reason", "state_at_input", "opcode", "length", "cid", "payload",
+           "minimized", "minimize_execs", "extra")
+_KNOWN = {"reason", "state_at_input", "original_payload_hex", "minimized_payload_hex",
+          "cid", "length", "minimize_execs"}
+_INSERT = f"INSERT INTO anomalies ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+def connect(path: str) -> sqlite3.Connection:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def to_row(record: dict) -> tuple:
+    """JSONL record -> column tuple. opcode is the first byte of the payload
+    as sent (or of the minimized one for rows without an original)."""
+    ohex = record.get("original_payload_hex")
+    mhex = record.get("minimized_payload_hex")
+    payload = bytes.fromhex(ohex) if ohex is not None else None
+    minimized = bytes.fromhex(mhex) if mhex is not None else None
+    first = payload if payload is not None else minimized
+    extra = {k: v for k, v in record.items() if k not in _KNOWN}
+    return (record.get("reason"), record.get("state_at_input"),
+            first[0] if first else None, record.get("length"), record.get("cid"),
+            payload, minimized, record.get("minimize_execs"),
+            json.dumps(extra) if extra else None)
+
+def to_record(row: tuple) -> dict:
+    """Column tuple (in COLUMNS order) -> record in the anomalies.jsonl schema;
+    columns that were absent from the original record are left out."""
+    reason, state, _, length, cid, payload, minimized, execs, extra = row
+    rec = {}
+    for key, val in (("reason", reason), ("state_at_input", state),
+                     ("original_payload_hex", None if payload is None else payload.hex()),
+                     ("minimized_payload_hex", None if minimized is None else minimized.hex()),
+                     ("cid", cid), ("length", length)):
+        if val is not None:
+            rec[key] = val
+    if extra:
+        rec.update(json.loads(extra))
+    if execs is not None:
+        rec["minimize_execs"] = execs
+    return rec
+
+class SqliteSink:
+    """Drop-in for sinks.JsonlSink as StatefulFuzzer's anomaly_sink; rows are
+    inserted in one transaction per batch."""
+    def __init__(self, path: str, batch_size: int = 256, mode: str = "w"):
+        if mode == "w" and os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._db = connect(path)
+        self._buf = []
+        self.rows = 0
+
+    def write(self, row: dict):
+        self._buf.append(to_row(row))
+        self.rows += 1
+        if len(self._buf) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            with self._db:
+                self._db.executemany(_INSERT, self._buf)
+            self._buf.clear()
+
+    def offset(self) -> int:
+        """Flush and return the last row id (a run_fuzz.py checkpoint mark)."""
+        self.flush()
+        return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM anomalies").fetchone()[0]
+
+    @classmethod
+    def reopen(cls, path: str, offset: int, batch_size: int = 256):
+        """Drop rows inserted after offset and continue appending."""
+        sink = cls(path, batch_size, mode="a")
+        with sink._db:
+            sink._db.execute("DELETE FROM anomalies WHERE id > ?", (offset,))
+        return sink
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def connect_ro(path: str) -> sqlite3.Connection:
+    """Open an existing store read-only; a mistyped path raises instead of
+    leaving an empty database behind."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no anomaly store at {path}")
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+# Index used for the first filter present, and the filters it serves
+_INDEXES = (("ix_reason", ("reason",)), ("ix_state_opcode", ("state", "opcode")),
+            ("ix_opcode", ("opcode",)), ("ix_length", ("length",)))
+
+def query(path: str, state: str = None, opcode: int = None, reason: str = None,
+          min_length: int = None, max_length: int = None, after_id: int = 0, limit: int = None):
+    """Yield (id, record) for matching rows in insertion order. reason matches
+    as a prefix (e.g. "Anomaly: ConfigReq"). The ids of rows passing the
+    filters an index serves (_INDEXES) are selected from that index alone, then
+    rows are looked up by id in id order: no full scan and no sort, which
+    SQLite does not pick by itself for ORDER BY id without ANALYZE statistics."""
+    conds = {}
+    if state is not None:
+        conds["state"] = ("state_at_input = ?", [state])
+    if opcode is not None:
+        conds["opcode"] = ("opcode = ?", [opcode])
+    if reason is not None:
+        conds["reason"] = ("reason >= ? AND reason < ?", [reason, reason + "\uffff"])
+    bounds = [(op, v) for op, v in ((">=", min_length), ("<=", max_length)) if v is not None]
+    if bounds:
+        conds["length"] = (" AND ".join(f"length {op} ?" for op, _ in bounds), [v for _, v in bounds])
+    where, params = ["id > ?"], [after_id]
+    index, keys = next(((ix, ks) for ix, ks in _INDEXES if ks[0] in conds), (None, ()))
+    if index is not None:
+        inner = [conds.pop(k) for k in keys if k in conds]
+        where.append(f"id IN (SELECT id FROM anomalies INDEXED BY {index} WHERE id > ? AND "
+                     + " AND ".join(c for c, _ in inner) + ")")
+        params.append(after_id)
+        for _, ps in inner:
+            params += ps
+    for c, ps in conds.values():
+        where.append(c); params += ps
+    sql = f"SELECT id, {', '.join(COLUMNS)} FROM anomalies WHERE {' AND '.join(where)} ORDER BY id"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    db = connect_ro(path)
+    try:
+        for row in db.execute(sql, params):
+            yield row[0], to_record(row[1:])
+    finally:
+        db.close()
+
+def merge_files(parts, out_path: str, remove: bool = True):
+    """Append shard stores (e.g. from --workers) into out_path, in order."""
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    db = connect(out_path)
+    cols = ", ".join(COLUMNS)
+    for p in parts:
+        if not os.path.exists(p):
+            continue
+        db.execute("ATTACH DATABASE ? AS part", (p,))
+        with db:
+            db.execute(f"INSERT INTO anomalies ({cols}) SELECT {cols} FROM part.anomalies ORDER BY id")
+        db.execute("DETACH DATABASE part")
+        if remove:
+            os.remove(p)
+    db.close()
+
+def export_jsonl(db_path: str, out_path: str) -> int:
+    n = 0
+    with open(out_path, "w") as f:
+        for _, rec in query(db_path):
+            f.write(json.dumps(rec) + "\n")
+            n += 1
+    return n
+
+def import_jsonl(jsonl_path: str, db_path: str, batch_size: int = 1024) -> int:
+    with SqliteSink(db_path, batch_size) as sink, open(jsonl_path) as f:
+        for line in f:
+            if line.strip():
+                sink.write(json.loads(line))
+        return sink.rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("query", help="print matching rows as JSONL")
+    q.add_argument("--db", default="results/anomalies.db")
+    q.add_argument("--state")
+    q.add_argument("--opcode", type=lambda s: int(s, 0))
+    q.add_argument("--reason", help="reason prefix")
+    q.add_argument("--min-length", type=int)
+    q.add_argument("--max-length", type=int)
+    q.add_argument("--limit", type=int)
+    e = sub.add_parser("export", help="write the store back out as anomalies.jsonl")
+    e.add_argument("db")
+    e.add_argument("out")
+    i = sub.add_parser("import", help="load an anomalies.jsonl into a new store")
+    i.add_argument("jsonl")
+    i.add_argument("db")
+    args = ap.parse_args()
+
+    if args.cmd in ("query", "export") and not os.path.exists(args.db):
+        ap.error(f"no anomaly store at {args.db}")
+    if args.cmd == "query":
+        for _, rec in query(args.db, args.state, args.opcode, args.reason,
+                            args.min_length, args.max_length, limit=args.limit):
+            sys.stdout.write(json.dumps(rec) + "\n")
+    elif args.cmd == "export":
+        print(f"Exported {export_jsonl(args.db, args.out)} rows to {args.out}")
+    else:
+        print(f"Imported {import_jsonl(args.jsonl, args.db)} rows into {args.db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# sweep.py
+# Exhaustive enumeration of short payloads: every payload of 0..--max-len
+# bytes (256**3 = 16.7M at length 3) in every State, declared length
+# len(payload) (+/- --skew), classified in batches by vectorized predicates
+# built from spec.py (plus VulnerableSimulator's flaws with --target vuln).
+# Batches are one first byte (opcode) each; opcodes without a rule in the
+# state are a single "wrong opcode" region without any per-input work.
+# Every region boundary and --spot-check random inputs per batch are replayed
+# through the real simulator's handle() and must get the same verdict.
+#
+# Usage:
+#   pip install numpy
+#   python sweep.py --max-len 3                      # results/sweep.json
+#   python sweep.py --max-len 2 --skew 1 --target vuln
+import argparse, json, os, random, time
+import numpy as np
+from l2cap_sim import L2CAPSimulator, State, Anomaly, CP, DT
+from vuln_sim import VulnerableSimulator
+from packet import L2CAPFrame
+from events import EventBus
+from spec import BY_OPCODE, TRANSITIONS, layout, staged
+from fast_sim import CODE, _WRONG_OPCODE
+
+TARGETS = {"reference": L2CAPSimulator, "vuln": VulnerableSimulator}
+VERDICTS = ("ok", "anomaly", "crash", "leak", "bypass")
+_OVERSIZED = ("crash", "FatalFault: Simulated crash: oversized config frame")
+
+class Classes:
+    """Interned (verdict, reason) pairs; regions store the index."""
+    def __init__(self):
+        self.items, self._ids = [], {}
+
+    def id(self, verdict: str, reason: str) -> int:
+        key = (verdict, reason)
+        i = self._ids.get(key)
+        if i is None:
+            i = self._ids[key] = len(self.items)
+            self.items.append(key)
+        return i
+
+def observe(sim, snap, payload: bytes, n: int, found: list):
+    """(verdict, reason) from the real handle(); found collects its events."""
+    sim.restore(snap)
+    found.clear()
+    try:
+        sim.handle(L2CAPFrame(length=n, cid=sim.cid, payload=payload))
+    except Anomaly as e:
+        return "anomaly", str(e)
+    except Exception as e:
+        return "crash", f"{type(e).__name__}: {e}"
+    return (found[-1].kind if found else "ok"), f"->{sim.state.name}"
+
+def _rule_codes(spec, nxt, cols, L: int, n: int, size: int, classes: Classes):
+    """Codes for one batch of payloads starting with spec.opcode: the spec's
+    checks in L2CAPSimulator order, first failure wins."""
+    codes = np.full(size, classes.id("ok", f"->{nxt.name}"), np.uint16)
+    pending = np.ones(size, bool)
+    def fail(mask, verdict, reason):
+        hit = pending & mask
+        codes[hit] = classes.id(verdict, reason)
+        pending[hit] = False
+    fields = layout(spec)
+    if all(f.size is not None for f in spec.fields):
+        if n != 1 + sum(f.size for f in spec.fields):
+            fail(True, "anomaly", f"{spec.name} wrong length")
+    else:
+        least = 1 + sum(f.size if f.size is not None else f.min_size for f in spec.fields)
+        if least > 1 and n < least:
+            fail(True, "anomaly", f"{spec.name} too short")
+    for f, off in fields:
+        if f.length_of:
+            if off >= L:
+                fail(True, "crash", "IndexError: index out of range")
+            else:
+                fail(off + 1 + cols[off].astype(np.int32) != n,
+                     "anomaly", f"{spec.name} {f.length_of} length mismatch")
+    for f, off in fields:
+        if f.valid is not None:
+            bad = np.zeros(size, bool) if off + f.size <= L else np.ones(size, bool)
+            for i, v in enumerate(f.valid):
+                if off + i < L:
+                    bad |= cols[off + i] != v
+            fail(bad, "anomaly", f"{spec.name} not OK")
+    return codes
+
+def classify(state: State, L: int, n: int, b0: int, classes: Classes, vuln: bool):
+    """Codes for every payload of length L starting with b0 (L >= 1), in
+    lexicographic order of the remaining bytes."""
+    size = 256 ** (L - 1)
+    spec = BY_OPCODE.get(b0) if (state, b0) in TRANSITIONS else None
+    if vuln and state == State.CONFIGURING and n > 64:
+        return np.full(size, classes.id(*_OVERSIZED), np.uint16)
+    if vuln and state == State.OPEN and b0 == DT and n == 1:
+        return np.full(size, classes.id("leak", "->OPEN"), np.uint16)
+    if spec is None:
+        return np.full(size, classes.id("anomaly", _WRONG_OPCODE[CODE[state]]), np.uint16)
+    idx = np.arange(size, dtype=np.uint32)
+    # cols[i]: payload byte i (cols[0] is the opcode, constant in the batch)
+    cols = [None] + [((idx >> (8 * (L - 1 - i))) & 0xFF).astype(np.uint8) for i in range(1, L)]
+    codes = _rule_codes(spec, TRANSITIONS[(state, b0)], cols, L, n, size, classes)
+    if vuln and state == State.CONNECTING and b0 == CP and n == 3 and L >= 3:
+        codes[(cols[1] == 0x13) & (cols[2] == 0x37)] = classes.id("bypass", "->OPEN")
+    return codes
+
+def runs(codes, base: int):
+    """[(first index, last index, code)] of equal-code stretches."""
+    cuts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = np.concatenate(([0], cuts))
+    ends = np.concatenate((cuts - 1, [len(codes) - 1]))
+    return [(base + int(s), base + int(e), int(codes[s])) for s, e in zip(starts, ends)]
+
+def sweep(max_len: int = 3, skew: int = 0, target: str = "reference", spot_check: int = 64,
+          seed: int = 0):
+    """Classify every (state, payload up to max_len bytes, declared length);
+    returns (report dict, inputs classified, handle() spot checks)."""
+    vuln = target == "vuln"
+    sim_cls = TARGETS[target]
+    sim, snaps, found = sim_cls(), staged(sim_cls), []
+    sim.bus = EventBus(found.append)
+    rng = random.Random(seed)
+    classes = Classes()
+    report, inputs, checks = {}, 0, 0
+
+    def check(L, n, i, code):
+        payload = i.to_bytes(L, "big") if L else b""
+        got = observe(sim, snaps[state], payload, n, found)
+        if got != classes.items[code]:
+            raise AssertionError(f"{state.name} payload {payload.hex() or '(empty)'} length {n}: "
+                                 f"predicted {classes.items[code]}, handle() gave {got}")
+
+    for state in State:
+        regions = report[state.name] = {}
+        for L in range(max_len + 1):
+            for n in range(max(0, L - skew), L + skew + 1):
+                merged = []
+                if L == 0:
+                    merged = [(0, 0, classes.id(*_OVERSIZED) if vuln and state == State.CONFIGURING
+                               and n > 64 else classes.id("anomaly", "Empty payload not allowed"))]
+                for b0 in range(256 if L else 0):
+                    codes = classify(state, L, n, b0, classes, vuln)
+                    block = runs(codes, b0 * len(codes))
+                    for lo, hi, code in block:
+                        if merged and merged[-1][2] == code and merged[-1][1] + 1 == lo:
+                            merged[-1] = (merged[-1][0], hi, code)
+                        else:
+                            merged.append((lo, hi, code))
+                    # handle() must agree at every run edge and on random inputs
+                    for lo, hi, code in block:
+                        check(L, n, lo, code); check(L, n, hi, code)
+                        checks += 2
+                    for _ in range(min(spot_check, len(codes))):
+                        j = rng.randrange(len(codes))
+                        check(L, n, b0 * len(codes) + j, int(codes[j]))
+                        checks += 1
+                if L == 0:
+                    check(L, n, 0, merged[0][2])
+                    checks += 1
+                inputs += 256 ** L
+                counts = dict.fromkeys(VERDICTS, 0)
+                for lo, hi, code in merged:
+                    counts[classes.items[code][0]] += hi - lo + 1
+                regions[f"len={L} declared={n}"] = {
+                    "counts": {k: v for k, v in counts.items() if v},
+                    "regions": [[f"{lo:0{2 * L}x}", f"{hi:0{2 * L}x}", code] for lo, hi, code in merged],
+                }
+    return {"target": target, "max_len": max_len, "skew": skew,
+            "classes": [list(c) for c in classes.items], "states": report}, inputs, checks
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max-len", type=int, default=3, help="longest payload enumerated (256**K inputs)")
+    ap.add_argument("--skew", type=int, default=0,
+                    help="also sweep declared lengths up to this far from len(payload)")
+    ap.add_argument("--target", choices=sorted(TARGETS), default="reference")
+    ap.add_argument("--spot-check", type=int, default=64,
+                    help="random inputs per batch replayed through handle() (region edges always are)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="results/sweep.json")
+    args = ap.parse_args()
+
+    t0 = time.time()
+    report, inputs, checks = sweep(args.max_len, args.skew, args.target, args.spot_check, args.seed)
+    dt = time.time() - t0
+    report.update(inputs=inputs, handle_checks=checks, seconds=dt)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+
+    print(f"Classified {inputs:,} inputs in {dt:.2f}s; {checks:,} handle() spot checks agreed.\n")
+    for state, regions in report["states"].items():
+        totals = dict.fromkeys(VERDICTS, 0)
+        for r in regions.values():
+            for k, v in r["counts"].items():
+                totals[k] += v
+        n_regions = sum(len(r["regions"]) for r in regions.values())
+        print(f"{state:>12}: " + "  ".join(f"{k} {v:,}" for k, v in totals.items() if v)
+              + f"  ({n_regions} regions)")
+    print("\nWrote:", args.out)
+
+if __name__ == "__main__":
+    main()
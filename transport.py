@@ -0,0 +1,463 @@
+# transport.py
+# Drive a target over a socket instead of calling sim.handle() in-process.
+# A stand-in server hosts L2CAPSimulator / VulnerableSimulator on a Unix socket
+# (one fresh simulator per connection, optional per-frame link latency); the
+# client runs many concurrent sessions, each pipelining up to --inflight frames
+# on its connection, with timeouts and a reconnect whenever the target crashes
+# (FatalFault) or drifts from the session's local protocol model.
+#
+#   python transport.py serve --path /tmp/l2fuzz.sock --target vuln --latency 0.005
+#   python transport.py fuzz --connect /tmp/l2fuzz.sock --sessions 32 --inflight 8
+#   python transport.py fuzz --target vuln --latency 0.005 --sessions 32   # in-process server
+#   python transport.py parity --inflight 4   # same rows as run_fuzz.py for the same seed
+#
+# Wire format (little endian), one record per frame:
+#   request:  u16 n, then n bytes = L2CAP header (declared length, cid) + payload
+#             (the declared length is sent as-is, so length skew reaches the target)
+#   response: u8 kind, u16 n, then n bytes = serialized response frame or reason text
+import argparse, asyncio, contextlib, json, os, struct, sys, tempfile, time
+from collections import deque
+from packet import L2CAPFrame, serialize, parse_from, serialize_into, HEADER_LEN, MAX_FRAME
+from l2cap_sim import L2CAPSimulator, State, Anomaly
+from spec import staged
+from vuln_sim import VulnerableSimulator, FatalFault
+from concurrent.futures import ProcessPoolExecutor
+from fuzzer import StatefulFuzzer, derive_seeds, merge_summaries, minimize_many
+from dedup import reason_template
+from sinks import JsonlSink
+from events import EventBus
+
+OK, ANOMALY, REJECTED, ERROR, FATAL = range(5)
+KINDS = ("ok", "anomaly", "rejected", "error", "fatal")
+TARGETS = {"reference": L2CAPSimulator, "vuln": VulnerableSimulator}
+_LEN = struct.Struct("<H")
+_RESP = struct.Struct("<BH")
+_HDR = struct.Struct("<HH")
+
+def encode_frame(frame: L2CAPFrame) -> bytes:
+    """Request record; unlike packet.serialize the declared length is not checked."""
+    return _LEN.pack(HEADER_LEN + len(frame.payload)) + _HDR.pack(frame.length, frame.cid) + frame.payload
+
+def execute(sim, wire: bytes, buf=None):
+    """Run one received frame on sim; returns (kind, body). The frame goes
+    through the same serialize_into/parse_from checks as in run_trial, so a
+    length skew is rejected with the same reason as in-process."""
+    if buf is None:
+        buf = memoryview(bytearray(MAX_FRAME))
+    try:
+        length, cid = _HDR.unpack_from(wire)
+        frame = L2CAPFrame(length, cid, wire[HEADER_LEN:])
+        frame, _ = parse_from(buf[:serialize_into(frame, buf)])
+    except Exception as e:
+        return REJECTED, str(e).encode()
+    try:
+        resp = sim.handle(frame)
+    except FatalFault as e:
+        return FATAL, str(e).encode()
+    except Anomaly as e:
+        return ANOMALY, str(e).encode()
+    except Exception as e:
+        return ERROR, str(e).encode()
+    return OK, serialize(resp) if resp is not None else b""
+
+class TargetServer:
+    """Stand-in target: one sim_cls() per connection. Frames are executed in
+    arrival order; each response leaves `latency` seconds later, so latency
+    models the link round trip and pipelined frames overlap it. A FatalFault
+    answers FATAL and then drops the connection (the "device" restarted).
+    With a bus, every connection's simulator emits its findings there
+    (default: the simulator's own, i.e. the rate-limited console)."""
+    def __init__(self, sim_cls=L2CAPSimulator, latency: float = 0.0, bus=None):
+        self.sim_cls = sim_cls
+        self.latency = latency
+        self.bus = bus
+        self.stats = {"connections": 0, "frames": 0, "crashes": 0}
+        self._server = None
+        self._handlers = set()
+
+    async def start(self, path: str):
+        if os.path.exists(path):
+            os.remove(path)
+        self._server = await asyncio.start_unix_server(self._serve, path=path)
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Let open connections flush their delayed responses
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader, writer):
+        self.stats["connections"] += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+        loop = asyncio.get_running_loop()
+        sim = self.sim_cls()
+        if self.bus is not None:
+            sim.bus = self.bus
+        buf = memoryview(bytearray(MAX_FRAME))
+        out = asyncio.Queue()
+        sender = asyncio.create_task(self._send(writer, out))
+        try:
+            while True:
+                n = _LEN.unpack(await reader.readexactly(_LEN.size))[0]
+                kind, body = execute(sim, await reader.readexactly(n), buf)
+                self.stats["frames"] += 1
+                out.put_nowait((loop.time() + self.latency, _RESP.pack(kind, len(body)) + body))
+                if kind == FATAL:
+                    self.stats["crashes"] += 1
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        out.put_nowait((loop.time() + self.latency, None))
+        await sender
+
+    async def _send(self, writer, out):
+        # Responses go out in order, each once its own latency has elapsed
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                due, data = await out.get()
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if data is None:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+def _discard(futures):
+    """Drop response futures nobody will await (without 'never retrieved' noise)."""
+    for fut in futures:
+        if not fut.done():
+            fut.cancel()
+        elif not fut.cancelled():
+            fut.exception()
+
+class Connection:
+    """Client side of one target connection with at most `inflight` frames
+    awaiting a response; send() returns a future for the frame's (kind, body)."""
+    def __init__(self, path: str, inflight: int = 1):
+        self.path = path
+        self.inflight = max(1, inflight)
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._waiters = deque()
+        self._window = asyncio.Semaphore(self.inflight)
+        self._reader_task = asyncio.create_task(self._read())
+        return self
+
+    async def send(self, frame: L2CAPFrame) -> asyncio.Future:
+        await self._window.acquire()
+        fut = asyncio.get_running_loop().create_future()
+        if self._reader_task.done():
+            fut.set_exception(ConnectionResetError("target closed the connection"))
+            return fut
+        self._waiters.append(fut)
+        self._writer.write(encode_frame(frame))
+        return fut
+
+    async def _read(self):
+        try:
+            while True:
+                kind, n = _RESP.unpack(await self._reader.readexactly(_RESP.size))
+                body = await self._reader.readexactly(n)
+                fut = self._waiters.popleft()
+                self._window.release()
+                if not fut.done():
+                    fut.set_result((kind, body))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            while self._waiters:
+                fut = self._waiters.popleft()
+                self._window.release()
+                if not fut.done():
+                    fut.set_exception(ConnectionResetError("target closed the connection"))
+
+    async def close(self):
+        _discard(self._waiters)
+        self._writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self._writer.wait_closed()
+        self._reader_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._reader_task
+
+class TransportFuzzer(StatefulFuzzer):
+    """One session against a remote target. self.sim is a local model of the
+    protocol: each frame is applied to it as it is sent, so the next frame can
+    be generated for the predicted state without waiting for the response.
+    Verdicts (stats, anomaly records) come from the target's responses."""
+    def __init__(self, seed: int = 1337, path: str = None, inflight: int = 1,
+                 timeout: float = 5.0, **kw):
+        super().__init__(seed=seed, **kw)
+        self.path = path
+        self.inflight = max(1, inflight)
+        self.timeout = timeout
+        self.transport_stats = {"connects": 0, "reconnects": 0, "timeouts": 0, "fatal": 0,
+                                "divergences": 0, "lost_frames": 0}
+
+    def _model_step(self, frame) -> int:
+        """Apply frame to the local model; returns the kind the target should answer."""
+        try:
+            parsed, _ = parse_from(self._wire[:serialize_into(frame, self._wire)])
+        except Exception:
+            return REJECTED
+        try:
+            self.sim.handle(parsed)
+        except Anomaly:
+            return ANOMALY
+        except Exception:
+            return ERROR
+        finally:
+            # The model's findings are only counted; verdicts come from the target
+            self._event = None
+        return OK
+
+    def book(self, st: State, frame, kind: int, reason: str, after: State, op=None):
+        """Record the target's verdict the way run_trial records a local one.
+        after and op are the model state and scheduler operator captured when
+        the frame was sent: with inflight > 1 later frames have moved both on."""
+        self.stats["trials"] += 1
+        if kind != REJECTED:
+            self.stats["accepted"] += 1
+        if self.scheduler is not None:
+            self.scheduler.last = op
+        if kind == OK:
+            if self.timeline is not None:
+                self._log_event("Accepted", (st.name, after.name), after)
+            if self.scheduler is not None:
+                self._credit_operator(st, frame, "->" + after.name)
+            return
+        if kind == ANOMALY:
+            self.stats["anomalies"] += 1
+            reason = f"Anomaly: {reason}"
+        else:
+            self.stats["rejected"] += 1
+            reason = f"Parser/Runtime error: {reason}"
+        if self.timeline is not None:
+            self._log_event("Anomaly" if kind == ANOMALY else "Rejected", after=after)
+        if self.scheduler is not None:
+            self._credit_operator(st, frame, reason_template(reason))
+        self._record_anomaly(frame, reason, st)
+
+    def _minimize(self, record, job):
+        # ddmin inline would stall every session on the event loop; run() hands
+        # the queue to _minimize_off_loop
+        self._batch.append((record, job))
+
+    def _minimize_off_loop(self, flush: bool = False):
+        """Start minimizing queued records in the --minimize-jobs pool (batches
+        of minimize_batch), or else one by one in the loop's default thread pool."""
+        if not self._batch or (not flush and len(self._batch) < (self.minimize_batch
+                                                                  if self.minimize_jobs else 1)):
+            return
+        if self.minimize_jobs and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.minimize_jobs)
+        records, jobs = zip(*self._batch)
+        self._batch = []
+        self._pending.append((records, asyncio.get_running_loop().run_in_executor(
+            self._pool, minimize_many, jobs)))
+        self._n_pending += len(records)
+
+    async def _emit_minimized(self, wait: bool = False):
+        """_finish minimized records in discovery order, as far as they are done."""
+        while self._pending and (wait or self._pending[0][1].done()):
+            records, fut = self._pending.popleft()
+            for record, result in zip(records, await fut):
+                self._finish(record, result)
+            self._n_pending -= len(records)
+            wait = wait and self._n_pending > self.max_pending
+
+    async def _connect(self):
+        conn = await Connection(self.path, self.inflight).open()
+        self.transport_stats["connects"] += 1
+        # Fresh target connection: restart the model from DISCONNECTED (counters kept)
+        self.sim.restore(staged(self.sim_cls)[State.DISCONNECTED])
+        return conn
+
+    async def run(self, trials: int):
+        """Send `trials` frames, keeping up to `inflight` awaiting responses."""
+        conn = await self._connect()
+        pending = deque()      # (state, frame, expected kind, model state after, operator, future)
+        sent = 0
+        while sent < trials or pending:
+            if sent < trials and len(pending) < self.inflight:
+                st, frame, _ = self.next_frame()
+                expected = self._model_step(frame)
+                op = self.scheduler.last if self.scheduler is not None else None
+                pending.append((st, frame, expected, self.sim.state, op, await conn.send(frame)))
+                sent += 1
+                continue
+            st, frame, expected, after, op, fut = pending.popleft()
+            try:
+                kind, body = await asyncio.wait_for(fut, self.timeout)
+            except (asyncio.TimeoutError, ConnectionError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.transport_stats["timeouts"] += 1
+                self.transport_stats["lost_frames"] += 1 + len(pending)
+                _discard(p[-1] for p in pending)
+                pending.clear()
+                await conn.close()
+                conn = await self._connect()
+                self.transport_stats["reconnects"] += 1
+                continue
+            self.book(st, frame, kind, body.decode(errors="replace") if kind != OK else "", after, op)
+            self._minimize_off_loop()
+            await self._emit_minimized(wait=self._n_pending > self.max_pending)
+            resync = kind == FATAL
+            if kind == FATAL:
+                self.transport_stats["fatal"] += 1
+            elif kind != expected:
+                # Target and model disagree: later in-flight frames were built
+                # for the wrong state, so start both over
+                self.transport_stats["divergences"] += 1
+                resync = True
+            if resync:
+                self.transport_stats["lost_frames"] += len(pending)
+                _discard(p[-1] for p in pending)
+                pending.clear()
+                await conn.close()
+                conn = await self._connect()
+                self.transport_stats["reconnects"] += 1
+        await conn.close()
+        self._minimize_off_loop(flush=True)
+        while self._pending:
+            await self._emit_minimized(wait=True)
+        self.drain()
+
+    def summary(self):
+        return {**super().summary(), **self.transport_stats}
+
+async def fuzz(path: str, trials: int, sessions: int, seed: int, inflight: int,
+               timeout: float, anomaly_sink=None, timeline_sink=None, **kw):
+    """Split trials over concurrent sessions; returns the merged summary."""
+    seeds = [seed] if sessions == 1 else derive_seeds(seed, sessions)
+    counts = [trials // sessions + (1 if i < trials % sessions else 0) for i in range(sessions)]
+    fuzzers = [TransportFuzzer(seed=seeds[i], path=path, inflight=inflight, timeout=timeout,
+                               anomaly_sink=anomaly_sink, timeline_sink=timeline_sink,
+                               trial_offset=sum(counts[:i]), **kw)
+               for i in range(sessions)]
+    await asyncio.gather(*(fz.run(n) for fz, n in zip(fuzzers, counts)))
+    summaries = [fz.summary() for fz in fuzzers]
+    merged = summaries[0] if sessions == 1 else merge_summaries(summaries)
+    for k in fuzzers[0].transport_stats:
+        merged[k] = sum(s[k] for s in summaries)
+    return merged
+
+async def _session_records(trials: int, seed: int, inflight: int) -> list:
+    path = os.path.join(tempfile.mkdtemp(prefix="l2fuzz-"), "target.sock")
+    server = await TargetServer(L2CAPSimulator, 0.0, EventBus()).start(path)
+    try:
+        fz = TransportFuzzer(seed=seed, path=path, inflight=inflight)
+        await fz.run(trials)
+    finally:
+        await server.close()
+    return fz.anomalies
+
+def check_parity(trials: int = 3000, seed: int = 1337, inflight: int = 1) -> int:
+    """One transport session against a reference target must record the same
+    anomaly rows, minimized payloads included, as run_fuzz.py's in-process
+    StatefulFuzzer with the same seed; raise AssertionError on the first
+    difference. Returns the number of rows compared."""
+    local = StatefulFuzzer(seed=seed)
+    for _ in range(trials):
+        local.run_trial()
+    local.drain()
+    remote = asyncio.run(_session_records(trials, seed, inflight))
+    for i, (a, b) in enumerate(zip(local.anomalies, remote)):
+        if a != b:
+            raise AssertionError(f"row {i} differs: in-process {a} | transport {b}")
+    if len(local.anomalies) != len(remote):
+        raise AssertionError(f"{len(local.anomalies)} rows in-process, {len(remote)} over the transport")
+    return len(remote)
+
+async def _run_fuzz(args):
+    server, path = None, args.connect
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="l2fuzz-"), "target.sock")
+        # Findings on the in-process target are counted, not printed
+        server = await TargetServer(TARGETS[args.target], args.latency, EventBus()).start(path)
+    os.makedirs(args.out_dir, exist_ok=True)
+    t0 = time.time()
+    try:
+        with JsonlSink(os.path.join(args.out_dir, "anomalies.jsonl"), args.batch_size) as anomalies, \
+             JsonlSink(os.path.join(args.out_dir, "timeline.jsonl"), args.batch_size) as timeline:
+            summary = await fuzz(path, args.trials, max(1, args.sessions), args.seed, args.inflight,
+                                 args.timeout, anomaly_sink=anomalies, timeline_sink=timeline,
+                                 timeline_every=args.timeline_every, schedule=args.schedule,
+                                 minimize_jobs=args.minimize_jobs,
+                                 sim_cls=TARGETS[args.model or args.target])
+    finally:
+        if server is not None:
+            await server.close()
+    dt = time.time() - t0
+    summary.update(sessions=args.sessions, inflight=args.inflight, seconds=dt,
+                   frames_per_sec=summary["trials"] / dt if dt > 0 else None)
+    if server is not None:
+        summary["target"] = {"class": TARGETS[args.target].__name__, "latency": args.latency,
+                             **server.stats, "impact": dict(server.bus.counts)}
+    with open(os.path.join(args.out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+async def _run_serve(args):
+    server = await TargetServer(TARGETS[args.target], args.latency).start(args.path)
+    print(f"Serving {TARGETS[args.target].__name__} on {args.path} (latency {args.latency}s)",
+          file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="host a simulator on a Unix socket")
+    s.add_argument("--path", default="/tmp/l2fuzz.sock")
+    c = sub.add_parser("parity", help="check transport rows against the in-process fuzzer")
+    c.add_argument("--trials", type=int, default=3000)
+    c.add_argument("--seed", type=int, default=1337)
+    c.add_argument("--inflight", type=int, default=1)
+    f = sub.add_parser("fuzz", help="fuzz a target over the transport")
+    f.add_argument("--connect", metavar="PATH", help="target socket (default: start a local server)")
+    f.add_argument("--trials", type=int, default=2000, help="frames, split across sessions")
+    f.add_argument("--sessions", type=int, default=1, help="concurrent connections")
+    f.add_argument("--inflight", type=int, default=1, help="pipelined frames per connection")
+    f.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for a response")
+    f.add_argument("--seed", type=int, default=1337)
+    f.add_argument("--batch-size", type=int, default=256)
+    f.add_argument("--timeline-every", type=int, default=10)
+    f.add_argument("--schedule", action="store_true")
+    f.add_argument("--minimize-jobs", type=int, default=0,
+                   help="minimize anomalies in a process pool of this size (default: a thread)")
+    f.add_argument("--model", choices=sorted(TARGETS),
+                   help="local protocol model used to pick frames (default: same as --target)")
+    f.add_argument("--out_dir", default="results")
+    for p in (s, f):
+        p.add_argument("--target", choices=sorted(TARGETS), default="reference")
+        p.add_argument("--latency", type=float, default=0.0, help="seconds added to each response")
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        asyncio.run(_run_serve(args))
+        return
+    if args.cmd == "parity":
+        n = check_parity(args.trials, args.seed, args.inflight)
+        print(f"Parity OK: {n} anomaly rows identical to the in-process fuzzer")
+        return
+    summary = asyncio.run(_run_fuzz(args))
+    print("\n=== TRANSPORT FUZZ SUMMARY ===")
+    print(json.dumps({k: v for k, v in summary.items()
+                      if k not in ("transition_hits", "state_opcode_hits", "finding_signatures")},
+                     indent=2))
+
+if __name__ == "__main__":
+    main()
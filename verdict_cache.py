@@ -0,0 +1,103 @@
+# verdict_cache.py
+# Memoized handle(): for one (simulator class, state, cid, frame cid, declared
+# length, payload) L2CAPSimulator and VulnerableSimulator always do the same
+# thing, only bytes_seen grows by the Data length. A miss runs handle() and
+# keeps what it did as a delta (next state, config_ok, bytes_seen increment,
+# response, exception, findings, the coverage counters it bumped); a hit
+# replays the delta without calling handle().
+#
+#   cache = process_cache(4096)          # one per process, shared by fuzzer and minimizer
+#   resp = cache.handle(sim, frame)      # drop-in for sim.handle(frame)
+#   cache.summary()                      # {"capacity", "size", "hits", "misses", ...}
+#
+# Not for fast_sim's engines: they are one table lookup already, and keep
+# transitions in a different form.
+from collections import OrderedDict
+from l2cap_sim import STATE_INDEX, N_STATES
+from events import Finding
+
+class VerdictCache:
+    """LRU map from handle() inputs to their outcome and side effects."""
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def handle(self, sim, frame):
+        key = (sim.__class__, sim.state, sim.cid, frame.cid, frame.length, bytes(frame.payload))
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return self._miss(sim, frame, key)
+        self.hits += 1
+        self._entries.move_to_end(key)
+        exc, state, config_ok, delta, resp, op_idx, edge, findings = entry
+        s0 = sim.state
+        if op_idx is not None:
+            sim.opcode_hits[op_idx] += 1
+        for kind, leaked in findings:
+            sim.bus.emit(Finding(kind, s0.name, frame, leaked))
+        sim.state = state
+        if config_ok:
+            sim.config_ok = True
+        sim.bytes_seen += delta
+        if edge is not None:
+            sim.edge_hits[edge] += 1
+            sim.transitions.add((s0.name, state.name))
+        if exc is not None:
+            raise exc[0](*exc[1])
+        return resp
+
+    def _miss(self, sim, frame, key):
+        s0, config0, seen0 = sim.state, sim.config_ok, sim.bytes_seen
+        row = STATE_INDEX[s0] * N_STATES
+        op_idx = (STATE_INDEX[s0] << 8) | frame.payload[0] if frame.payload else None
+        op0 = sim.opcode_hits[op_idx] if op_idx is not None else 0
+        edges0 = sim.edge_hits[row:row + N_STATES]
+        bus, found = getattr(sim, "bus", None), []
+        if bus is not None:
+            bus.subscribe(found.append)
+        resp = exc = None
+        try:
+            resp = sim.handle(frame)
+        except Exception as e:
+            exc = e
+        finally:
+            if bus is not None:
+                bus.unsubscribe(found.append)
+        edge = next((row + j for j, n in enumerate(edges0) if sim.edge_hits[row + j] != n), None)
+        self._entries[key] = (
+            None if exc is None else (type(exc), exc.args), sim.state,
+            sim.config_ok and not config0, sim.bytes_seen - seen0, resp,
+            op_idx if op_idx is not None and sim.opcode_hits[op_idx] != op0 else None,
+            edge, tuple((f.kind, f.leaked) for f in found))
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if exc is not None:
+            raise exc
+        return resp
+
+    def summary(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"capacity": self.capacity, "size": len(self._entries), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None}
+
+_caches = {}
+
+def process_cache(capacity: int) -> VerdictCache:
+    """This process's cache of that capacity (keys include the simulator class,
+    so every simulator and minimize job in the process can share it)."""
+    cache = _caches.get(capacity)
+    if cache is None:
+        cache = _caches[capacity] = VerdictCache(capacity)
+    return cache
+
+def merge_cache_stats(stats) -> dict:
+    """Sum VerdictCache.summary() dicts from several shards."""
+    stats = list(stats)
+    merged = {k: sum(s[k] for s in stats) for k in ("capacity", "size", "hits", "misses", "evictions")}
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_rate"] = merged["hits"] / lookups if lookups else None
+    return merged